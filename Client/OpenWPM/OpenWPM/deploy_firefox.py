@@ -14,6 +14,11 @@ from ..commands.profile_commands import load_profile
 from ..config import BrowserParamsInternal, ConfigEncoder, ManagerParamsInternal
 from ..utilities.platform_utils import get_firefox_binary_path
 from . import configure_firefox
+from .profile_templates import (
+    clone_profile_template,
+    get_profile_template,
+    profile_template_key,
+)
 from .selenium_firefox import FirefoxBinary, FirefoxLogInterceptor, Options
 
 DEFAULT_SCREEN_RES = (1366, 768)
@@ -53,10 +58,17 @@ def deploy_firefox(
             "BROWSER %i: Loading initial browser profile from: %s"
             % (browser_params.browser_id, browser_params.seed_tar)
         )
-        load_profile(
-            browser_profile_path,
-            browser_params,
-            browser_params.seed_tar,
+        # Preferences are passed through Options here, so the template is
+        # just the extracted seed profile
+        seed_tar = browser_params.seed_tar
+        key = profile_template_key("", seed_tar)
+        template = get_profile_template(
+            key, lambda path: load_profile(path, browser_params, seed_tar)
+        )
+        clone_profile_template(template, browser_profile_path)
+        logger.debug(
+            "BROWSER %i: Profile cloned from template %s"
+            % (browser_params.browser_id, template)
         )
     elif browser_params.recovery_tar:
         logger.debug(
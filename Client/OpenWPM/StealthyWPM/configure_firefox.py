@@ -1,12 +1,23 @@
 """ Set prefs and load extensions in Firefox """
 
+import hashlib
 import json
+import logging
+import os
 import re
+import tempfile
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional
 
 from ..config import BrowserParams
 
+logger = logging.getLogger("openwpm")
+
+# Pref sets are cached here across browser manager processes, one file per
+# configuration, next to the profile template cache
+PREF_SET_DIR = Path(tempfile.gettempdir()) / "bsync_pref_sets"
+
 # TODO: Remove hardcoded geckodriver default preferences. See
 # https://github.com/mozilla/OpenWPM/issues/867
 # Source of preferences:
@@ -67,6 +78,10 @@ DEFAULT_GECKODRIVER_PREFS = {
 }
 
 
+# Regular expression from https://stackoverflow.com/a/24563687
+_USER_PREF = re.compile(r"\s*user_pref\(([\"'])(.+?)\1,\s*(.+?)\);")
+
+
 def load_existing_prefs(browser_profile_path: Path) -> Dict[str, Any]:
     """Load existing user preferences.
 
@@ -77,26 +92,134 @@ def load_existing_prefs(browser_profile_path: Path) -> Dict[str, Any]:
     prefs_path = browser_profile_path / "user.js"
     if not prefs_path.is_file():
         return prefs
-    # Regular expression from https://stackoverflow.com/a/24563687
-    r = re.compile(r"\s*user_pref\(([\"'])(.+?)\1,\s*(.+?)\);")
     with open(prefs_path, "r") as f:
         for line in f:
-            m = r.match(line)
+            m = _USER_PREF.match(line)
             if m:
                 key, value = m.group(2), m.group(3)
                 prefs[key] = json.loads(value)
     return prefs
 
 
+def render_user_js(prefs: Mapping) -> bytes:
+    """Render preferences as user.js content, sorted by name"""
+    return "".join(
+        'user_pref("%s", %s);\n' % (key, json.dumps(prefs[key])) for key in sorted(prefs)
+    ).encode()
+
+
 def save_prefs_to_profile(prefs: Dict[str, Any], browser_profile_path: Path) -> None:
     """Save all preferences to the browser profile.
 
     Write preferences from the prefs dictionary to a user.js file in the
     profile directory.
     """
-    with open(browser_profile_path / "user.js", "w") as f:
-        for key, value in prefs.items():
-            f.write('user_pref("%s", %s);\n' % (key, json.dumps(value)))
+    write_user_js(render_user_js(prefs), browser_profile_path)
+
+
+def write_user_js(blob: bytes, browser_profile_path: Path) -> None:
+    with open(browser_profile_path / "user.js", "wb") as f:
+        f.write(blob)
+
+
+class PrefSet(Mapping):
+    """
+    Frozen set of preferences with its pre-rendered user.js blob and a stable
+    hash of it. Built once per browser configuration and host (see
+    pref_set_for), so a launch only writes the blob.
+    """
+
+    def __init__(
+        self, prefs: Dict[str, Any], blob: Optional[bytes] = None, prefs_hash: Optional[str] = None
+    ) -> None:
+        self._prefs = dict(prefs)
+        self.blob = render_user_js(self._prefs) if blob is None else blob
+        self.hash = hashlib.sha256(self.blob).hexdigest() if prefs_hash is None else prefs_hash
+
+    def __getitem__(self, key: str) -> Any:
+        return self._prefs[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._prefs)
+
+    def __len__(self) -> int:
+        return len(self._prefs)
+
+    @classmethod
+    def load(cls, path: Path) -> "PrefSet":
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data["prefs"], data["blob"].encode(), data["hash"])
+
+    def save(self, path: Path) -> None:
+        """Write the set to path atomically, concurrent launches may read it"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name("%s.%i.tmp" % (path.name, os.getpid()))
+        with open(tmp_path, "w") as f:
+            json.dump({"hash": self.hash, "blob": self.blob.decode(), "prefs": self._prefs}, f)
+        os.replace(tmp_path, path)
+
+    def user_js_for(self, browser_profile_path: Path) -> bytes:
+        """
+        user.js content for a profile: the prefs of its existing user.js,
+        overridden by this set. Only template builds and recovered profiles
+        get here, so the merge is not cached.
+        """
+        if not (browser_profile_path / "user.js").is_file():
+            return self.blob
+        prefs = load_existing_prefs(browser_profile_path)
+        prefs.update(self._prefs)
+        return render_user_js(prefs)
+
+
+def pref_set_for(browser_params: BrowserParams) -> PrefSet:
+    """
+    The preferences deploy_firefox writes for browser_params: geckodriver
+    defaults, privacy, optimize_prefs, bsyncoptions and the custom prefs.
+    Built by the first launch of a configuration and read from PREF_SET_DIR
+    by later ones, since every launch runs in a new browser manager process.
+    """
+    key = json.dumps(
+        [
+            # Edits to this file change the prefs a configuration gets
+            os.stat(__file__).st_mtime_ns,
+            browser_params.donottrack,
+            browser_params.tp_cookies,
+            browser_params.tracking_protection,
+            getattr(browser_params, "change_useragent", False),
+            getattr(browser_params, "set_proxy", False),
+            browser_params.prefs,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    path = PREF_SET_DIR / (hashlib.sha256(key.encode()).hexdigest()[:32] + ".json")
+    try:
+        return PrefSet.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    prefs = dict(DEFAULT_GECKODRIVER_PREFS)
+    # Configure privacy settings
+    privacy(browser_params, prefs)
+    # Set various prefs to improve speed and eliminate traffic to Mozilla
+    optimize_prefs(prefs)
+    # Set proxy and useragent for bsync
+    bsyncoptions(browser_params, prefs)
+    # Set custom prefs. These are set after all of the default prefs to allow
+    # our defaults to be overwritten.
+    for name, value in browser_params.prefs.items():
+        logger.info(
+            "BROWSER %i: Setting custom preference: %s = %s"
+            % (browser_params.browser_id, name, value)
+        )
+        prefs[name] = value
+    pref_set = PrefSet(prefs)
+    try:
+        pref_set.save(path)
+    except OSError as e:
+        logger.warning("Could not cache preferences in %s: %s" % (path, e))
+    return pref_set
 
 
 def privacy(browser_params: BrowserParams, prefs: Dict[str, Any]) -> None:
@@ -1,3 +1,4 @@
+import fcntl
 import json
 import logging
 import os.path
@@ -15,11 +16,79 @@ from ..commands.profile_commands import load_profile
 from ..config import BrowserParamsInternal, ConfigEncoder, ManagerParamsInternal
 from ..utilities.platform_utils import get_firefox_binary_path
 from . import configure_firefox
+from .profile_templates import (
+    clone_profile_template,
+    get_profile_template,
+    profile_template_key,
+)
 from .selenium_firefox import FirefoxBinary, FirefoxLogInterceptor, Options
 
 DEFAULT_SCREEN_RES = (1366, 768)
 logger = logging.getLogger("openwpm")
 
+# Marionette ports are leased from this range through a lock file shared by
+# every launch on the host, so concurrent launches never get the same port
+MARIONETTE_PORTS = range(28300, 28800)
+MARIONETTE_LEASE_FILE = Path(tempfile.gettempdir()) / "bsync_marionette_ports.json"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _port_free(port: int) -> bool:
+    with socket.socket() as s:
+        try:
+            s.bind(("", port))
+        except OSError:
+            return False
+    return True
+
+
+def lease_marionette_port() -> int:
+    """
+    Lease a Marionette port to this browser manager process. A lease is
+    reclaimed once its process has exited, and a process holds one lease at
+    a time, so a relaunch returns the previous port to the pool.
+    """
+    pid = os.getpid()
+    with open(MARIONETTE_LEASE_FILE, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                leases = {int(port): owner for port, owner in json.loads(f.read() or "{}").items()}
+            except ValueError:
+                leases = {}
+            leases = {
+                port: owner
+                for port, owner in leases.items()
+                if owner != pid and _pid_alive(owner)
+            }
+            # Ports outside of bsync (or still in TIME_WAIT) are skipped
+            port = next(
+                (p for p in MARIONETTE_PORTS if p not in leases and _port_free(p)), None
+            )
+            if port is None:
+                raise RuntimeError(
+                    "No free Marionette port in %i-%i"
+                    % (MARIONETTE_PORTS.start, MARIONETTE_PORTS.stop - 1)
+                )
+            leases[port] = pid
+            f.seek(0)
+            f.truncate()
+            json.dump(leases, f)
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return port
+
 
 def deploy_firefox(
     status_queue: Queue,
@@ -49,26 +118,49 @@ def deploy_firefox(
     fo.add_argument(str(browser_profile_path))
 
     assert browser_params.browser_id is not None
-    if browser_params.seed_tar and not crash_recovery:
-        logger.info(
-            "BROWSER %i: Loading initial browser profile from: %s"
-            % (browser_params.browser_id, browser_params.seed_tar)
-        )
-        load_profile(
-            browser_profile_path,
-            browser_params,
-            browser_params.seed_tar,
+    seed_tar = browser_params.seed_tar if not crash_recovery else None
+
+    # Geckodriver currently places the user.js file in the wrong profile
+    # directory, so we have to create it manually here.
+    # TODO: See https://github.com/mozilla/OpenWPM/issues/867 for when
+    # to remove this workaround.
+    pref_set = configure_firefox.pref_set_for(browser_params)
+
+    def write_prefs(profile_path: Path, tar_path: Optional[Path]) -> None:
+        if tar_path:
+            load_profile(profile_path, browser_params, tar_path)
+        # Preferences of the profile's user.js file are overwritten by ours
+        configure_firefox.write_user_js(pref_set.user_js_for(profile_path), profile_path)
+
+    if seed_tar or not browser_params.recovery_tar:
+        if seed_tar:
+            logger.info(
+                "BROWSER %i: Loading initial browser profile from: %s"
+                % (browser_params.browser_id, seed_tar)
+            )
+        # The extension is installed through Marionette after launch, it is not
+        # part of the template
+        key = profile_template_key(pref_set.hash, seed_tar)
+        template = get_profile_template(key, lambda path: write_prefs(path, seed_tar))
+        clone_profile_template(template, browser_profile_path)
+        logger.debug(
+            "BROWSER %i: Profile cloned from template %s"
+            % (browser_params.browser_id, template)
         )
-    elif browser_params.recovery_tar:
+    else:
+        # A recovered profile is unique to this browser, it is not cached
         logger.debug(
             "BROWSER %i: Loading recovered browser profile from: %s"
             % (browser_params.browser_id, browser_params.recovery_tar)
         )
-        load_profile(
-            browser_profile_path,
-            browser_params,
-            browser_params.recovery_tar,
-        )
+        write_prefs(browser_profile_path, browser_params.recovery_tar)
+
+    marionette_port = lease_marionette_port()
+    # The port differs per launch, so it is appended to the cloned user.js;
+    # the last user_pref of a name wins
+    with open(browser_profile_path / "user.js", "a") as f:
+        f.write('user_pref("marionette.port", %s);\n' % json.dumps(marionette_port))
+
     status_queue.put(("STATUS", "Profile Tar", None))
 
     display_mode = browser_params.display_mode
@@ -115,50 +207,11 @@ def deploy_firefox(
         # TODO restore detailed logging
         # fo.set_preference("extensions.@openwpm.sdk.console.logLevel", "all")
 
-    # Geckodriver currently places the user.js file in the wrong profile
-    # directory, so we have to create it manually here.
-    # TODO: See https://github.com/mozilla/OpenWPM/issues/867 for when
-    # to remove this workaround.
-    # Load existing preferences from the profile's user.js file
-    prefs = configure_firefox.load_existing_prefs(browser_profile_path)
-    # Load default geckodriver preferences
-    prefs.update(configure_firefox.DEFAULT_GECKODRIVER_PREFS)
-    # Pick an available port for Marionette (https://stackoverflow.com/a/2838309)
-    # This has a race condition, as another process may get the port
-    # before Marionette, but we don't expect it to happen often
-    s = socket.socket()
-    s.bind(("", 0))
-    marionette_port = s.getsockname()[1]
-    s.close()
-    prefs["marionette.port"] = marionette_port
-
-    # Configure privacy settings
-    configure_firefox.privacy(browser_params, prefs)
-
-    # Set various prefs to improve speed and eliminate traffic to Mozilla
-    configure_firefox.optimize_prefs(prefs)
-
-    # Set proxy and useragent for bsync
-    configure_firefox.bsyncoptions(browser_params, prefs)
-
-
     # Intercept logging at the Selenium level and redirect it to the
     # main logger.
     interceptor = FirefoxLogInterceptor(browser_params.browser_id)
     interceptor.start()
 
-    # Set custom prefs. These are set after all of the default prefs to allow
-    # our defaults to be overwritten.
-    for name, value in browser_params.prefs.items():
-        logger.info(
-            "BROWSER %i: Setting custom preference: %s = %s"
-            % (browser_params.browser_id, name, value)
-        )
-        prefs[name] = value
-
-    # Write all preferences to the profile's user.js file
-    configure_firefox.save_prefs_to_profile(prefs, browser_profile_path)
-
     # Launch the webdriver
     status_queue.put(("STATUS", "Launch Attempted", None))
     fb = FirefoxBinary(firefox_path=firefox_binary_path)
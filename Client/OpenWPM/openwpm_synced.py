@@ -9,27 +9,65 @@ Modified for use in the bsync synchronisation framework
 This script runs as subprocess and communicates via stdin/stdout.
 """
 
+import time
+# Start of module execution, for the STARTUP_PROFILE report
+MODULE_STARTED = time.perf_counter()
+
 import argparse
+import importlib
 import sys
 import json
+import select
+import shutil
 import signal
-import time
+import socket
+import tempfile
+import threading
 import os
 from hashlib import md5
 from pathlib import Path
 from typing import Literal, Optional
-from time import sleep
 import atexit
 import re
 from urllib.parse import urlparse, unquote
 
-from openwpm.command_sequence import CommandSequence
-from openwpm.commands.browser_commands import GetCommand, SaveScreenshotCommand as OriginalSaveScreenshotCommand
-from openwpm.config import BrowserParams, ManagerParams
-from openwpm.storage.sql_provider import SQLiteStorageProvider
-from openwpm.task_manager import TaskManager
-from openwpm.commands.types import BaseCommand
-from openwpm.commands.utils.webdriver_utils import wait_until_loaded
+
+# Deferred imports: cumulative time and number of modules each one loaded,
+# like -X importtime, reported in STARTUP_PROFILE
+import_times = {}
+
+
+def timed_import(module_name):
+    """Imports a module on first use and records what it cost."""
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    modules_before = len(sys.modules)
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_times[module_name] = {
+        "cumulative_ms": round((time.perf_counter() - started) * 1000, 1),
+        "modules": len(sys.modules) - modules_before,
+    }
+    return module
+
+
+def process_age_ms() -> Optional[int]:
+    """Milliseconds since this process was created (Linux), None if unknown."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round((uptime - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000)
+
+
+# Commands subclass BaseCommand, so it is needed at module load. The task
+# manager, storage provider and browser commands load when first used.
+BaseCommand = timed_import("openwpm.commands.types").BaseCommand
 
 # Local environment functions
 # from environment import get_environment_info
@@ -50,11 +88,11 @@ VISIT_PAGE_TIMEOUT = 10 # Default: 30
 # ========================
 
 
-class CustomSaveScreenshotCommand(OriginalSaveScreenshotCommand):
-    """A custom command to save a screenshot to a specific path, overriding the default."""
+class CustomSaveScreenshotCommand(BaseCommand):
+    """A custom command to save a screenshot to a specific path, replacing OpenWPM's SaveScreenshotCommand."""
     
     def __init__(self, path: Path, suffix: str = "", url_label: Optional[str] = None, url_index: Optional[int] = None):
-        super().__init__(suffix)
+        self.suffix = suffix
         self.path = path
         self.url_label = url_label
         self.url_index = url_index
@@ -112,84 +150,108 @@ class CustomSaveScreenshotCommand(OriginalSaveScreenshotCommand):
             log_message(f"Failed to save screenshot: {e}", "ERROR")
 
 
-class WaitForDoneCommand(BaseCommand):
-    """A custom command that waits until the page is fully loaded."""
-    
-    def __init__(self, url=None, timeout=30, additional_wait=0):
-        self.url = url
-        self.timeout = timeout
-        self.additional_wait = additional_wait
-    
+# Async script for PageLoadCommand. Waits for the load event, then for a
+# quiet period without finished resource loads (PerformanceObserver, no
+# polling) and returns the timestamps in epoch ms.
+PAGE_LOAD_SCRIPT = """
+var idleMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var lastActivity = performance.now(), idleTimer = null, observer = null;
+var deadline = setTimeout(function () { finish(null); }, timeoutMs);
+function finish(idleAt) {
+    clearTimeout(deadline);
+    clearTimeout(idleTimer);
+    if (observer) observer.disconnect();
+    var nav = performance.getEntriesByType("navigation")[0];
+    var origin = performance.timeOrigin;
+    done({
+        domContentLoaded: nav && nav.domContentLoadedEventEnd ? origin + nav.domContentLoadedEventEnd : null,
+        load: nav && nav.loadEventEnd ? origin + nav.loadEventEnd : null,
+        networkIdle: idleAt === null ? null : origin + idleAt
+    });
+}
+function armIdle() {
+    clearTimeout(idleTimer);
+    idleTimer = setTimeout(function () { finish(lastActivity); }, idleMs);
+}
+function watchNetwork() {
+    lastActivity = performance.now();
+    observer = new PerformanceObserver(function (list) {
+        list.getEntries().forEach(function (e) {
+            lastActivity = Math.max(lastActivity, e.responseEnd || e.startTime);
+        });
+        armIdle();
+    });
+    observer.observe({ type: "resource" });
+    armIdle();
+}
+if (document.readyState === "complete") watchNetwork();
+else window.addEventListener("load", watchNetwork, { once: true });
+"""
+
+
+class PageLoadCommand(BaseCommand):
+    """
+    Waits for page load and network idle with a single async script and
+    reports domContentLoaded, load and networkIdle (epoch ms, null if not
+    reached) as "PAGE_LOAD {json}" on stdout.
+    Resources are only seen once they finished; long-running requests are not
+    counted as activity.
+    The visit lasts `duration` seconds unless a datagram arrives on the Unix
+    socket end_socket (see OpenWPMCrawler._end_visit); the command runs in
+    the browser manager process, so this is how the crawler reaches it. An end
+    request during the load script takes effect once the script returned.
+    """
+
+    def __init__(self, duration: float = 3, idle_ms: int = 500, end_socket: Optional[str] = None):
+        self.duration = duration
+        self.idle_ms = idle_ms
+        self.end_socket = end_socket
+
     def __repr__(self):
-        return f"WaitForDoneCommand(timeout={self.timeout}, additional_wait={self.additional_wait})"
-    
-    def execute(self, webdriver, browser_params, manager_params, extension_socket):
-        """Waits until the page is fully loaded."""
+        return f"PageLoadCommand(duration={self.duration}, idle_ms={self.idle_ms}, end_socket={self.end_socket})"
+
+    def _bind_end_socket(self):
+        if not self.end_socket:
+            return None
         try:
-            # Safe version of wait_until_loaded that doesn't block
-            loaded = self._safe_wait_until_loaded(webdriver, self.timeout)
-            
-            if not loaded:
-                log_message(f"Page did not load completely within {self.timeout} seconds", "WARNING")
-            
-            # URL_DONE signal is now sent here when the website is actually finished
-            if self.url:
-                sys.stdout.write(f"URL_DONE: {self.url}\n")
-                #self.url = None  # Reset URL to prevent reuse on error
-            else:
-                sys.stdout.write("URL_DONE\n")
-            sys.stdout.flush()
+            if os.path.exists(self.end_socket):
+                os.unlink(self.end_socket)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(self.end_socket)
+            return sock
+        except OSError as e:
+            log_message(f"Could not bind end visit socket {self.end_socket}: {e}", "WARNING")
+            return None
 
-            # Additional wait time for dynamic content
-            if self.additional_wait > 0:
-                time.sleep(self.additional_wait)
-                
-        except Exception as e:
-            log_message(f"WaitForDoneCommand error: {e}", "WARNING")
-            # Send URL_DONE so that the crawler can continue
-            if self.url:
-                sys.stdout.write(f"URL_DONE: {self.url}\n")
-                # self.url = None  # Reset URL to prevent reuse on error
-            else:
-                sys.stdout.write("URL_DONE\n")
-            sys.stdout.flush()
-    
-    def _safe_wait_until_loaded(self, webdriver, timeout, period=0.25):
-        """Safe version of wait_until_loaded that catches WebDriverExceptions."""
-        start_time = time.time()
-        mustend = time.time() + timeout
-        
-        while time.time() < mustend:
+    def execute(self, webdriver, browser_params, manager_params, extension_socket):
+        """Waits for the load events, reports them and stays until the visit ends."""
+        started = time.monotonic()
+        # Bound before the script runs so end requests sent meanwhile are queued
+        end_sock = self._bind_end_socket()
+        try:
+            timings = {}
             try:
-                # Try to check document.readyState
-                ready_state = webdriver.execute_script("return document.readyState")
-                if ready_state == "complete":
-                    return True
+                webdriver.set_script_timeout(self.duration + 5)
+                timings = webdriver.execute_async_script(PAGE_LOAD_SCRIPT, self.idle_ms, int(self.duration * 1000)) or {}
             except Exception as e:
-                # If execute_script fails, the browser is probably in a
-                # problematic state. Log it and return False.
-                log_message(f"execute_script failed in _safe_wait_until_loaded: {e}", "DEBUG")
-                return False
-            
-            time.sleep(period)
-        
-        return False
+                log_message(f"PageLoadCommand script failed: {e}", "WARNING")
 
+            sys.stdout.write(f"PAGE_LOAD {json.dumps(timings)}\n")
+            sys.stdout.flush()
 
-class SleepCommand(BaseCommand):
-    """A custom command that pauses execution for a specified duration."""
-    
-    def __init__(self, duration: float):
-        self.duration = duration
-    
-    def __repr__(self):
-        return f"SleepCommand(duration={self.duration})"
-    
-    def execute(self, webdriver, browser_params, manager_params, extension_socket):
-        """Pauses execution for the specified duration in seconds."""
-        if self.duration > 0:
-            log_message(f"Pausing for {self.duration} seconds.", "DEBUG")
-            time.sleep(self.duration)
+            remaining = self.duration - (time.monotonic() - started)
+            if end_sock is None:
+                if remaining > 0:
+                    time.sleep(remaining)
+            elif select.select([end_sock], [], [], max(remaining, 0))[0]:
+                log_message(f"Visit ended early after {time.monotonic() - started:.2f} seconds", "DEBUG")
+        finally:
+            if end_sock is not None:
+                end_sock.close()
+                try:
+                    os.unlink(self.end_socket)
+                except OSError:
+                    pass
 
 
 class SignalCommand(BaseCommand):
@@ -209,6 +271,34 @@ class SignalCommand(BaseCommand):
             log_message(f"Sent signal: {self.signal}", "DEBUG")
 
 
+class DeadlineTimer(threading.Thread):
+    """
+    Runs a function at an absolute time.monotonic() deadline on its own thread,
+    so the stdin loop stays responsive while a visit is pending.
+    """
+
+    def __init__(self, deadline: float, function, name: str = "visit-timer"):
+        super().__init__(name=name, daemon=True)
+        self.deadline = deadline
+        self.function = function
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stops the timer if it has not fired yet."""
+        self._cancelled.set()
+
+    def run(self):
+        # Event.wait returns early only on cancel; loop to absorb early wakeups
+        while True:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._cancelled.wait(remaining):
+                return
+        if not self._cancelled.is_set():
+            self.function()
+
+
 def log_message(message, level="INFO"):
     """Helper function for structured logging."""
     sys.stdout.write(f"[{level}] {message}\n")
@@ -231,8 +321,33 @@ class OpenWPMCrawler:
     def __init__(self, args):
         self.args = args
         self.manager = None
-        self.num_browsers = 1
+        # Hot standby: a second TaskManager browser with a clean profile, swapped
+        # in on reset while the old one restarts in the background
+        self.standby = getattr(self.args, 'standby_browsers', False)
+        self.num_manager_browsers = 2 if self.standby else 1
+        # TaskManager index of the browser visits run on, and of its standby
+        self.active_index = 0
+        self.standby_index = 1
+        # Set while the standby is warm; standby_ok is False if its last restart failed
+        self.standby_ready = threading.Event()
+        self.standby_ready.set()
+        self.standby_ok = True
         self.crawling_in_progress = False # Add a flag to track crawl state
+        # Visit waiting for its start deadline; fire() and _cancel_pending_visit race for it
+        self.pending_visit = None
+        self._visit_lock = threading.Lock()
+        # TaskManager calls are made from the stdin loop, visit timers and the standby
+        # thread; every one of them holds this lock
+        self._manager_lock = threading.Lock()
+        # Unix socket the running PageLoadCommand listens on for end_visit
+        self.end_visit_dir = tempfile.mkdtemp(prefix="openwpm-end-visit-")
+        self.end_visit_socket = os.path.join(self.end_visit_dir, "visit.sock")
+        atexit.register(shutil.rmtree, self.end_visit_dir, True)
+        # Set once the TaskManager is up (or failed to start)
+        self.manager_started = threading.Event()
+        self.manager_ms = None
+        # Exit status _on_shutdown ends the process with
+        self.exit_status = 0
         
         # Configure screen resolution and page load timeout first
         self.screen_width = getattr(self.args, 'screen_width', None)
@@ -241,11 +356,6 @@ class OpenWPMCrawler:
         self.log_file_path = self.args.logfilepath
         self.use_default_resolution = getattr(self.args, 'use_default_resolution', False)
         
-        # Create configuration
-        self.manager_params = ManagerParams(num_browsers=self.num_browsers)
-        self.browser_params = self._create_browser_params()
-        self._setup_data_directory()
-        
         # Register signal handlers
         signal.signal(signal.SIGTERM, self._on_shutdown)
         signal.signal(signal.SIGINT, self._on_shutdown)
@@ -263,23 +373,24 @@ class OpenWPMCrawler:
     
     def _create_browser_params(self):
         """Creates and configures browser parameters."""
+        BrowserParams = timed_import("openwpm.config").BrowserParams
         display_mode: Literal["native", "headless", "xvfb"] = (
             "headless" if self.args.headless else "native"
         )
         
         browser_params = [
             BrowserParams(display_mode=display_mode) 
-            for _ in range(self.num_browsers)
+            for _ in range(self.num_manager_browsers)
         ]
         
         # Apply browser configuration
-        for browser_param in browser_params:
-            self._configure_browser_param(browser_param)
+        for manager_index, browser_param in enumerate(browser_params):
+            self._configure_browser_param(browser_param, manager_index)
         
         return browser_params
     
-    def _configure_browser_param(self, browser_param):
-        """Configures a single browser parameter."""
+    def _configure_browser_param(self, browser_param, manager_index=0):
+        """Configures a single browser parameter; the standby gets its own proxy port."""
         # Disable OpenWPM instrumentation
         browser_param.http_instrument = True
         browser_param.cookie_instrument = True
@@ -293,6 +404,9 @@ class OpenWPMCrawler:
         # Configure custom profile path if provided
         if self.args.browserprofilepath:
             custom_profile_dir = Path(self.args.browserprofilepath)
+            if self.num_manager_browsers > 1:
+                # The browser and its standby can't share a profile
+                custom_profile_dir = custom_profile_dir / f"browser_{manager_index}"
             custom_profile_dir.mkdir(parents=True, exist_ok=True) # Ensure the directory exists
             
             # Define the path for the live Firefox profile to be used directly
@@ -340,7 +454,8 @@ class OpenWPMCrawler:
         
         # Proxy configuration if provided
         if self.args.proxyhost and self.args.proxyport:
-            self._configure_proxy(browser_param)
+            # A standby warming up on its own port never shows up in the capture of the active browser
+            self._configure_proxy(browser_param, self._proxy_port_for(manager_index))
         
         # Toggle cache (default: disabled)
         if getattr(self.args, "enable_cache", False):
@@ -361,15 +476,28 @@ class OpenWPMCrawler:
         else:
             log_message(f"Browser parameters configured - Resolution: {self.screen_width}x{self.screen_height}, Page load timeout: {self.page_load_timeout}s")
     
-    def _configure_proxy(self, browser_param):
+    def _proxy_port_for(self, manager_index):
+        """Proxy port of a TaskManager browser: --proxyport, and the next port for the standby."""
+        return self.args.proxyport + manager_index
+
+    def _browser_ready_line(self, restart_ms: Optional[int] = None):
+        """The browser_ready line; with a standby it names the proxy port of the active browser."""
+        line = "browser_ready"
+        if restart_ms is not None:
+            line += f" restart_ms={restart_ms}"
+        if self.standby and self.args.proxyhost and self.args.proxyport:
+            line += f" proxy_port={self._proxy_port_for(self.active_index)}"
+        return line + "\n"
+
+    def _configure_proxy(self, browser_param, proxy_port):
         """Configures proxy settings."""
         browser_param.prefs["network.proxy.type"] = 1
         browser_param.prefs["network.proxy.http"] = self.args.proxyhost
-        browser_param.prefs["network.proxy.http_port"] = self.args.proxyport
+        browser_param.prefs["network.proxy.http_port"] = proxy_port
         browser_param.prefs["network.proxy.ssl"] = self.args.proxyhost
-        browser_param.prefs["network.proxy.ssl_port"] = self.args.proxyport
+        browser_param.prefs["network.proxy.ssl_port"] = proxy_port
         browser_param.prefs["network.proxy.socks"] = self.args.proxyhost
-        browser_param.prefs["network.proxy.socks_port"] = self.args.proxyport
+        browser_param.prefs["network.proxy.socks_port"] = proxy_port
         browser_param.prefs["network.proxy.socks_version"] = 5
         browser_param.prefs["network.proxy.socks_remote_dns"] = True
         browser_param.prefs["network.proxy.share_proxy_settings"] = True
@@ -378,7 +506,7 @@ class OpenWPMCrawler:
         # Clear the `no_proxies_on` setting to capture all traffic.
         browser_param.prefs["network.proxy.no_proxies_on"] = ""
         
-        log_message(f"Proxy configured: {self.args.proxyhost}:{self.args.proxyport}")
+        log_message(f"Proxy configured: {self.args.proxyhost}:{proxy_port}")
     
     def _setup_data_directory(self):
         """Sets up the data directory."""
@@ -396,57 +524,87 @@ class OpenWPMCrawler:
         log_message("Graceful shutdown signal received", "INFO")
         if self.manager:
             self.manager.close()
-        sys.exit(0)
+        sys.exit(self.exit_status)
     
-    def _wait_for_browser_ready(self, browser_id, timeout=60):
-        """Waits until browser is ready."""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            # Ensure browsers exist and browser_id is valid
-            if (hasattr(self.manager, 'browsers') and 
-                self.manager.browsers is not None and 
-                browser_id < len(self.manager.browsers) and
-                self.manager.browsers[browser_id] is not None):
-                
-                # Original ready() method from BrowserManagerHandle
-                browser = self.manager.browsers[browser_id]
-                if browser.ready():
-                    log_message(f"Browser {browser_id} ready")
-                    return True
-            else:
-                log_message(f"Browser {browser_id} not yet initialized", "DEBUG")
-            
-            time.sleep(0.5)
-        
-        log_message(f"Browser {browser_id} not ready after {timeout}s", "ERROR")
+    def _wait_for_browser_ready(self, manager_index, timeout=60):
+        """Waits until browser is ready, i.e. its command thread (if any) has ended."""
+        browsers = getattr(self.manager, 'browsers', None)
+        if browsers is None or manager_index >= len(browsers) or browsers[manager_index] is None:
+            log_message(f"Browser {manager_index} not initialized", "ERROR")
+            return False
+
+        browser = browsers[manager_index]
+        # ready() of BrowserManagerHandle is true once no command thread is alive;
+        # joining the thread waits for that without polling
+        command_thread = getattr(browser, 'command_thread', None)
+        if command_thread is not None:
+            command_thread.join(timeout)
+        if browser.ready():
+            log_message(f"Browser {manager_index} ready")
+            return True
+
+        log_message(f"Browser {manager_index} not ready after {timeout}s", "ERROR")
         return False
     
-    def _check_all_browsers_ready(self):
-        """Checks if all browsers are ready."""
-        all_ready = True
-        for browser_id in range(self.num_browsers):
-            if not self._wait_for_browser_ready(browser_id):
-                all_ready = False
+    def _check_all_browsers_ready(self, restart_ms: Optional[int] = None):
+        """Checks if the active browser is ready; restart_ms is reported with browser_ready after a restart."""
+        all_ready = self._wait_for_browser_ready(self.active_index)
         
         if all_ready:
-            sys.stdout.write("browser_ready\n")
+            sys.stdout.write(self._browser_ready_line(restart_ms))
             sys.stdout.flush()
         
         return all_ready
     
-    def _visit_url(self, url, wait_time=0, visit_duration=3, url_label: Optional[str] = None, url_index: Optional[int] = None):
-        """Visits a URL with specified parameters."""
-
-        self.crawling_in_progress = True # Set the flag to indicate a crawl is running
+    def _schedule_visit(self, deadline: float, **visit_args):
+        """Starts the visit once time.monotonic() reaches deadline."""
+        def fire():
+            with self._visit_lock:
+                if self.pending_visit is not timer:
+                    return  # Cancelled just now
+                self.pending_visit = None
+            late_ms = (time.monotonic() - deadline) * 1000
+            if late_ms > 1:
+                log_message(f"Visit started {late_ms:.1f}ms after its deadline", "DEBUG")
+            try:
+                self._visit_url(**visit_args)
+            except Exception as e:
+                # No command sequence runs, so no callback ends the iteration
+                log_message(f"Failed to start visit: {e}", "ERROR")
+                self.crawling_in_progress = False
+                sys.stdout.write("URL_ERROR\n")
+                sys.stdout.write("BROWSER_FINISHED\n")
+                sys.stdout.flush()
+
+        timer = DeadlineTimer(deadline, fire)
+        self.pending_visit = timer
+        timer.start()
+
+    def _end_visit(self):
+        """Ends the stay of the visit in progress, e.g. after the proxy saw network idle."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            try:
+                sock.sendto(b"end", self.end_visit_socket)
+                log_message("End of visit requested")
+            except OSError:
+                # Visit still loading or already past its stay
+                log_message("Browser not staying on a page, end_visit ignored", "DEBUG")
+
+    def _cancel_pending_visit(self):
+        """Cancels a visit that has not started yet and frees the browser."""
+        # Whoever takes the timer first, fire() or this method, owns the visit
+        with self._visit_lock:
+            timer, self.pending_visit = self.pending_visit, None
+        if timer is None:
+            return
+        timer.cancel()
+        self.crawling_in_progress = False
+        log_message("Cancelled pending visit", "WARNING")
 
-        # Validate wait_time and set to 0 if invalid
-        if not isinstance(wait_time, (int, float)) or wait_time < 0:
-            wait_time = 0
-            log_message("Invalid wait_time, setting to 0", "WARNING")
-            
-        if wait_time > 0:
-            log_message(f"Waiting {wait_time}ms before URL visit")
-            sleep(wait_time / 1000)
+    def _visit_url(self, url, visit_duration=3, url_label: Optional[str] = None, url_index: Optional[int] = None):
+        """Visits a URL with specified parameters."""
+        browser_commands = timed_import("openwpm.commands.browser_commands")
+        CommandSequence = timed_import("openwpm.command_sequence").CommandSequence
         
         # Create inline callback, this now only handles the final BROWSER_FINISHED signal
         def callback(success: bool, error_info: dict = None) -> None:
@@ -455,7 +613,7 @@ class OpenWPMCrawler:
                 print(f"CommandSequence for {url} ran successfully")
 
                 # URL_DONE is no longer sent here.
-                # It is now sent by WaitForDoneCommand to ensure accurate timing.
+                # It is now sent by a SignalCommand after the visit to ensure accurate timing.
                 #sys.stdout.write(f"URL_DONE {url}\n")
                 #sys.stdout.flush()
             else:
@@ -475,9 +633,10 @@ class OpenWPMCrawler:
                     log_message(f"Unknown error in CommandSequence for {url}", "ERROR")
                     sys.stdout.write(f"URL_ERROR\n") 
             
+            # Reset before signalling so the next visit_url is not ignored
+            self.crawling_in_progress = False # Reset the flag
             sys.stdout.write("BROWSER_FINISHED\n")
             sys.stdout.flush()
-            self.crawling_in_progress = False # Reset the flag
         
         # Create CommandSequence
         command_sequence = CommandSequence(
@@ -494,14 +653,18 @@ class OpenWPMCrawler:
 
         # 1. Load the page (without sleeping)
         command_sequence.append_command(
-           GetCommand(url=url, sleep=0), # sleep is now 0
+           browser_commands.GetCommand(url=url, sleep=0), # sleep is now 0
            timeout=VISIT_PAGE_TIMEOUT
         )
 
-        # 2. Pause for the specified visit duration
+        # 2. Stay for the visit duration, reporting load and network idle times
         command_sequence.append_command(
-            SleepCommand(duration=visit_duration),
-            timeout=visit_duration + 5 # Timeout slightly longer than duration
+            PageLoadCommand(
+                duration=visit_duration,
+                idle_ms=self.args.network_idle_ms,
+                end_socket=self.end_visit_socket,
+            ),
+            timeout=visit_duration + 10 # Timeout slightly longer than duration
         )
 
         # 3. Send URL_DONE signal after waiting
@@ -519,56 +682,99 @@ class OpenWPMCrawler:
             )
             log_message(f"Screenshot command added for path: {screenshot_path}")
 
-        # Append WaitForDoneCommand to command sequence to signal when the page was loaded
-        
-        # command_sequence.append_command(
-        #     WaitForDoneCommand(url=url, timeout=self.page_load_timeout - 2, additional_wait=0), 
-        #     timeout=self.page_load_timeout # Use the full page load timeout
-        # )
-        
         log_message(f"Visiting URL: {url}")
         
-        # Execute the full sequence
-        self.manager.execute_command_sequence(command_sequence)
+        # Execute the full sequence on the active browser
+        self._wait_for_manager()
+        with self._manager_lock:
+            self.manager.execute_command_sequence(command_sequence, index=self.active_index)
         
         # URL_DONE Signal moved to callback function for proper timing
         # sys.stdout.write("URL_DONE\n")
         # sys.stdout.flush()
     
+    def _restart_browser(self, manager_index, clear_profile=False):
+        """Restarts one TaskManager browser; runs on a restart or standby thread."""
+        try:
+            success = self.manager.browsers[manager_index].restart_browser_manager(
+                clear_profile=clear_profile
+            )
+        except Exception as e:
+            log_message(f"Error restarting browser {manager_index}: {e}", "ERROR")
+            return False
+        if success:
+            log_message(f"Browser {manager_index} restarted successfully")
+        else:
+            log_message(f"Failed to restart browser {manager_index}", "ERROR")
+        return success
+
     def _restart_browsers(self, clear_profile=False):
-        """Restarts all browsers."""
-        success_count = 0
+        """Restarts the active browser and reports how long it took."""
+        self._wait_for_manager()
+        started = time.monotonic()
         
-        for browser_id in range(self.num_browsers):
-            try:
-                success = self.manager.browsers[browser_id].restart_browser_manager(
-                    clear_profile=clear_profile
-                )
-                if success:
-                    log_message(f"Browser {browser_id} restarted successfully")
-                    success_count += 1
-                else:
-                    log_message(f"Failed to restart browser {browser_id}", "ERROR")
-            except Exception as e:
-                log_message(f"Error restarting browser {browser_id}: {e}", "ERROR")
+        # A pending visit would start on a browser that is going away
+        self._cancel_pending_visit()
+
+        # The manager lock keeps visits from being issued meanwhile
+        with self._manager_lock:
+            success = self._restart_browser(self.active_index, clear_profile)
+        restart_ms = round((time.monotonic() - started) * 1000)
+        log_message(f"Browser restart took {restart_ms} ms")
         
         # Check browser readiness
-        self._check_all_browsers_ready()
+        self._check_all_browsers_ready(restart_ms)
         
-        return success_count == self.num_browsers
+        return success
     
-    def _handle_visit_url_command(self, line):
-        """Handles visit_url commands."""
-        if self.crawling_in_progress:
-            log_message("Crawl already in progress, ignoring new visit_url command.", "WARNING")
-            return
-
+    def _warm_standby(self, manager_index):
+        """Restarts the swapped-out browser with a clean profile as the next standby."""
+        # TaskManager makes no promise that a browser can be restarted while a command
+        # sequence is being issued to another one, so the restart holds the manager lock.
+        # A visit due meanwhile starts late (logged by _schedule_visit) rather than racing it.
+        with self._manager_lock:
+            self.standby_ok = self._restart_browser(manager_index, clear_profile=True)
+        self.standby_ready.set()
+
+    def _swap_to_standby(self):
+        """Resets the browser by swapping in the warm standby."""
+        self._wait_for_manager()
+        started = time.monotonic()
+        self._cancel_pending_visit()
+
+        if not self.standby_ready.is_set():
+            log_message("Standby still starting, waiting for it", "WARNING")
+            self.standby_ready.wait()
+        if not self.standby_ok:
+            # Retry in place rather than swapping in a broken browser
+            log_message("Standby failed, restarting it now", "WARNING")
+            with self._manager_lock:
+                self.standby_ok = self._restart_browser(self.standby_index, clear_profile=True)
+        with self._manager_lock:
+            old_index = self.active_index
+            self.active_index = self.standby_index
+            self.standby_index = old_index
+        self.standby_ready.clear()
+        threading.Thread(
+            target=self._warm_standby,
+            args=(old_index,),
+            name="standby",
+            daemon=True,
+        ).start()
+        log_message(f"Swapped to standby browser {self.active_index}")
+
+        reset_ms = round((time.monotonic() - started) * 1000)
+        self._check_all_browsers_ready(reset_ms)
+
+    def _handle_visit_url_command(self, line, received_at: float):
+        """Handles visit_url commands; the visit starts at startAt (epoch ms), else waitingTime after received_at (time.monotonic())."""
         data = parse_command_data(line, "visit_url")
         if not data:
             return
         
         url = data.get("url")
         wait_time = data.get("waitingTime", 0)
+        start_at = data.get("startAt")
         visit_duration = data.get("visitDuration", 3)
         clear_url = data.get("clearUrl")
         url_index = data.get("urlIndex")
@@ -576,20 +782,46 @@ class OpenWPMCrawler:
         if not url:
             log_message("No valid URL in visit_url command", "ERROR")
             return
+
+        # Validate wait_time and set to 0 if invalid
+        if not isinstance(wait_time, (int, float)) or wait_time < 0:
+            wait_time = 0
+            log_message("Invalid wait_time, setting to 0", "WARNING")
+        if isinstance(start_at, (int, float)):
+            # Same host clock as the worker, so the time the command spent in the pipe doesn't count
+            deadline = time.monotonic() + max(start_at / 1000 - time.time(), 0)
+        else:
+            deadline = received_at + wait_time / 1000
+
+        if self.crawling_in_progress:
+            log_message("Crawl already in progress, ignoring new visit_url command.", "WARNING")
+            return
+        self.crawling_in_progress = True # Set the flag to indicate a crawl is running
         
         log_message(f"visit_url signal received: {url}, waiting time: {wait_time}, visit duration: {visit_duration}, clearUrl: {clear_url}, urlIndex: {url_index}")
         # Use clear_url for naming (human-readable original URL); fall back to url
-        self._visit_url(url, wait_time, visit_duration, url_label=clear_url or url, url_index=url_index)
+        self._schedule_visit(
+            deadline,
+            url=url,
+            visit_duration=visit_duration,
+            url_label=clear_url or url,
+            url_index=url_index,
+        )
     
     def _process_stdin_command(self, line):
         """Processes a single stdin command."""
+        received_at = time.monotonic()
         line = line.strip()
         
         if line.startswith("visit_url"):
-            self._handle_visit_url_command(line)
+            self._handle_visit_url_command(line, received_at)
+
+        elif line == "end_visit":
+            self._end_visit()
             
         elif line == "exit":
             log_message("Exit command received")
+            self._cancel_pending_visit()
             return False  # Ends main loop
             
         elif line == "restart":
@@ -598,17 +830,65 @@ class OpenWPMCrawler:
             
         elif line == "reset":
             log_message("Reset command received")
-            self._restart_browsers(clear_profile=True)
+            if self.standby:
+                self._swap_to_standby()
+            else:
+                self._restart_browsers(clear_profile=True)
             
         elif line == "check_readiness":
-            sys.stdout.write("browser_ready\n")
-            sys.stdout.flush()
+            # With --early_ready the start thread reports readiness once the TaskManager is up
+            if self.manager_started.is_set() and self.manager is not None:
+                sys.stdout.write(self._browser_ready_line())
+                sys.stdout.flush()
             
         else:
             log_message(f"Unknown command: {line}", "WARNING")
         
         return True
     
+    def _start_manager(self):
+        """Creates the configuration and starts the TaskManager, importing it on first use."""
+        started = time.monotonic()
+        try:
+            ManagerParams = timed_import("openwpm.config").ManagerParams
+            self.manager_params = ManagerParams(num_browsers=self.num_manager_browsers)
+            self.browser_params = self._create_browser_params()
+            self._setup_data_directory()
+            SQLiteStorageProvider = timed_import("openwpm.storage.sql_provider").SQLiteStorageProvider
+            TaskManager = timed_import("openwpm.task_manager").TaskManager
+            self.manager = TaskManager(
+                self.manager_params,
+                self.browser_params,
+                SQLiteStorageProvider(self.data_directory / "crawl-data.sqlite"),
+                None,
+            )
+            self.manager_ms = round((time.monotonic() - started) * 1000)
+            log_message(f"TaskManager started in {self.manager_ms} ms")
+        except Exception as e:
+            log_message(f"TaskManager failed to start: {e}", "ERROR")
+        finally:
+            self.manager_started.set()
+
+    def _wait_for_manager(self):
+        """Blocks until the TaskManager is up; raises if it failed to start."""
+        if not self.manager_started.is_set():
+            log_message("Waiting for the TaskManager to start", "WARNING")
+            self.manager_started.wait()
+        if self.manager is None:
+            raise RuntimeError("TaskManager is not running")
+
+    def _report_startup(self, ready_ms):
+        """Writes the startup profile as a STARTUP_PROFILE {json} line."""
+        profile = {
+            "process_age_ms": process_age_ms(),
+            "ready_ms": ready_ms,
+            "manager_ms": self.manager_ms,
+            "early_ready": self.args.early_ready,
+            "imports": import_times,
+        }
+        sys.stdout.write(f"STARTUP_PROFILE {json.dumps(profile)}\n")
+        sys.stdout.flush()
+
     def run(self):
         """Main execution of the crawler."""
         # Output environment info not implemented yet
@@ -616,32 +896,45 @@ class OpenWPMCrawler:
         # log_message(f"OpenWPM Version: {env_info['openwpm_version']}")
         # log_message(f"Firefox Version: {env_info['firefox_version']}")
         
-        # Start TaskManager
-        with TaskManager(
-            self.manager_params,
-            self.browser_params,
-            SQLiteStorageProvider(self.data_directory / "crawl-data.sqlite"),
-            None,
-        ) as manager:
-            self.manager = manager
-            log_message("TaskManager started")
-            
+        if self.args.early_ready:
+            # Prelaunch the TaskManager alongside the stdin loop (commands that need it
+            # wait for it) and report ready as soon as it is up, without the per-browser
+            # readiness checks
+            def start():
+                self._start_manager()
+                if self.manager is None:
+                    # Ends the stdin loop through _on_shutdown
+                    self.exit_status = 1
+                    os.kill(os.getpid(), signal.SIGTERM)
+                    return
+                sys.stdout.write(self._browser_ready_line())
+                sys.stdout.flush()
+                self._report_startup(round((time.perf_counter() - MODULE_STARTED) * 1000))
+
+            threading.Thread(target=start, name="task-manager-start", daemon=True).start()
+        else:
+            self._start_manager()
+            if self.manager is None:
+                sys.exit(1)
             # Check browser readiness
             self._check_all_browsers_ready()
+            self._report_startup(round((time.perf_counter() - MODULE_STARTED) * 1000))
             
-            # Main loop for stdin commands
-            try:
-                for line in sys.stdin:
-                    if not self._process_stdin_command(line):
-                        break  # Exit command received
-                        
-            except KeyboardInterrupt:
-                log_message("KeyboardInterrupt received", "INFO")
-            except Exception as e:
-                log_message(f"Unexpected error: {e}", "ERROR")
-            finally:
+        # Main loop for stdin commands
+        try:
+            for line in sys.stdin:
+                if not self._process_stdin_command(line):
+                    break  # Exit command received
+                    
+        except KeyboardInterrupt:
+            log_message("KeyboardInterrupt received", "INFO")
+        except Exception as e:
+            log_message(f"Unexpected error: {e}", "ERROR")
+        finally:
+            self.manager_started.wait()
+            if self.manager:
                 log_message("TaskManager shutting down")
-                manager.close(relaxed=False)
+                self.manager.close(relaxed=False)
 
 
 def main():
@@ -651,10 +944,16 @@ def main():
     parser.add_argument("--crawldatapath", type=str, default="./datadir/")
     parser.add_argument("--proxyhost", type=str, default=None)
     parser.add_argument("--proxyport", type=int, default=None)
+    parser.add_argument("--standby_browsers", action="store_true", default=False,
+                        help="Keep a warm standby browser with a clean profile on --proxyport + 1 and swap to it on reset")
+    parser.add_argument("--early_ready", action="store_true", default=False,
+                        help="Start the TaskManager next to the stdin loop and send browser_ready once it is up, skipping the per-browser readiness checks")
 
     parser.add_argument("--screen_width", type=int, default=None, help="Browser window width; omit to use OpenWPM default")
     parser.add_argument("--screen_height", type=int, default=None, help="Browser window height; omit to use OpenWPM default")
     parser.add_argument("--page_load_timeout", type=int, default=PAGE_LOAD_TIMEOUT, help="Page load timeout in seconds")
+    parser.add_argument("--network_idle_ms", type=int, default=500,
+                        help="Quiet period without finished resource loads that counts as network idle")
 
     parser.add_argument("--browserprofilepath", type=str, default=None, 
                        help="Custom base path for browser profiles")
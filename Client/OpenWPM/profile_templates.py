@@ -0,0 +1,111 @@
+"""
+Firefox profile template cache shared by the OpenWPM and StealthyWPM
+variants of deploy_firefox.py. 07_install_openwpm.sh installs it next to
+them in openwpm/deploy_browsers/.
+
+A launch gets a clone of a cached template instead of untarring the seed
+profile (and, in StealthyWPM, writing user.js) again.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+# Profile templates are cached here, one directory per template key
+PROFILE_TEMPLATE_DIR = Path(tempfile.gettempdir()) / "bsync_profile_templates"
+# Templates (and staging directories of crashed builds) unused for this long
+# are removed whenever a new template is built
+PROFILE_TEMPLATE_MAX_AGE = 24 * 3600
+# Linux ioctl cloning a file's extents copy-on-write (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+def profile_template_key(prefs_hash: str, seed_tar: Optional[Path]) -> str:
+    """
+    Key of the template built from prefs_hash and seed_tar. The seed tar is
+    identified by its path, size and mtime, so no launch has to read it.
+    """
+    h = hashlib.sha256(prefs_hash.encode())
+    if seed_tar and os.path.isfile(seed_tar):
+        st = os.stat(seed_tar)
+        h.update(
+            ("\0%s\0%i\0%i" % (os.path.abspath(seed_tar), st.st_size, st.st_mtime_ns)).encode()
+        )
+    return h.hexdigest()[:32]
+
+
+def _clone_file(src: Path, dst: Path) -> None:
+    if src.is_symlink():
+        os.symlink(os.readlink(src), dst)
+        return
+    # Firefox replaces add-on packages but never rewrites them, so they can be
+    # shared. Other files (SQLite databases) are updated in place and must not.
+    if src.suffix == ".xpi":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+def clone_profile_template(template: Path, browser_profile_path: Path) -> None:
+    """Clone a profile template into an empty profile directory"""
+    for root, dirs, files in os.walk(template):
+        rel = Path(root).relative_to(template)
+        for name in dirs:
+            (browser_profile_path / rel / name).mkdir(exist_ok=True)
+        for name in files:
+            _clone_file(Path(root) / name, browser_profile_path / rel / name)
+
+
+def prune_profile_templates(keep: Path) -> None:
+    """Remove templates other than keep that were not used for PROFILE_TEMPLATE_MAX_AGE"""
+    cutoff = time.time() - PROFILE_TEMPLATE_MAX_AGE
+    for entry in PROFILE_TEMPLATE_DIR.iterdir():
+        try:
+            if entry != keep and entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def get_profile_template(key: str, build: Callable[[Path], None]) -> Path:
+    """
+    Return the cached template for key, building it with build(directory)
+    first if needed. Templates are built in a staging directory and renamed
+    into place, so concurrent browsers never see a partial template.
+    """
+    template = PROFILE_TEMPLATE_DIR / key
+    if template.is_dir():
+        # The mtime marks the last use for prune_profile_templates
+        try:
+            os.utime(template)
+        except OSError:
+            pass
+        return template
+    PROFILE_TEMPLATE_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=key + ".", dir=PROFILE_TEMPLATE_DIR))
+    try:
+        build(staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    try:
+        os.rename(staging, template)
+    except OSError:
+        # Another browser published the same template first
+        shutil.rmtree(staging, ignore_errors=True)
+        if not template.is_dir():
+            raise
+    prune_profile_templates(template)
+    return template
@@ -5,6 +5,10 @@ const configuration = {
 	base: {
 		master_addr: "http://10.10.10.11:3000", 		// e.g. "http://localhost:3000"
 		pagevisit_duration: 10,							// Specify time in seconds the browser stays on websites
+		clock_sync_interval: 5000,						// Interval in ms of the clock sync with the scheduler for absolute visit start times, 0 to disable
+		end_visit_on_network_idle: false,				// Set true to end visits once the proxy saw network idle, after at least visit_min_duration
+		visit_min_duration: 3,							// Minimum time in seconds the browser stays on websites when ending visits on network idle
+		proxy_network_idle_ms: 1000,					// Quiet period in ms without flows in flight after which the proxy reports network idle
 
 		nfs_remote_filestorage: true,					// Set true to store har files on nfs server
 		delete_after_upload: true,						// Set true to delete the local har files after upload
@@ -13,6 +17,14 @@ const configuration = {
 
 		persistent_proxy: true,							// set true to keep the proxy running after the browser is closed
 		proxy_debug_output: false,						// Set true to show all proxy stdout output, false to show only processed IPC messages
+		har_file_extension: ".har",						// Proxy capture format: ".har" (JSON), ".zhar" (zlib JSON) or ".harl" (columnar zstd, see proxy/harl.py); ".hars" when har_stream_dir is set
+		har_compression: "none",						// Codec for ".har" captures: "none", "gzip", "zlib", "zstd" or "lz4" (appends .gz/.zz/.zst/.lz4)
+		har_compression_level: -1,						// Compression level for the capture codec, -1 for the codec default
+		har_stream_dir: "",								// Directory where the proxy streams entries to .hars spools while crawling, "" to disable (keep it on the same filesystem as the HARs)
+		har_flow_limit: 0,								// Per-URL limit of flows recorded in full by the proxy, further flows are only counted (0 = no limit)
+		har_flow_bytes_limit: 0,						// Per-URL limit of recorded HAR entry bytes, handled like har_flow_limit (0 = no limit)
+		proxy_timing_channel: false,					// Set true to receive first request/response and export timestamps from the proxy over a loopback UDP socket
+		proxy_control_socket: false,					// Set true to send proxy control commands over a Unix socket instead of *.proxy.local requests through the proxy
 		take_screenshot: true,							// Set true to create a screenshot of the visited page
 	},
 	// NOTE: Browser profiles are now centrally managed and stored in:
@@ -37,6 +49,9 @@ const configuration = {
 
 		crawl_script : "openwpm_synced.py", 
 		script_path : "/home/" + os.userInfo().username +"/Desktop/OpenWPM", 
+		network_idle_ms : 500,							// Quiet period in ms without finished resource loads that counts as network idle
+		standby_browsers : false,						// Set true to keep a warm standby browser with a clean profile; reset swaps to it instead of restarting. The standby uses proxy_port + 1
+		early_browser_ready : false,					// Set true to send browser_ready as soon as the OpenWPM TaskManager is up, skipping the per-browser readiness checks
 		crawl_data_path: "/home/" + os.userInfo().username +"/Downloads/Crawl-Data/",
 
 		enable_proxy : true,
@@ -17,6 +17,8 @@ let navigationTimeoutId = null;
 
 // ID for the timeout that runs after a page successfully loads or an error occurs, before navigating to about:blank
 let currentNavigationStayTimeoutId = null;
+// Ends the stay after a successful load early (end_visit from the worker), null otherwise
+let finishStay = null;
 // Holder for the specific about:blank onCompleted listener
 let aboutBlankLoadListener = null;
 
@@ -52,6 +54,11 @@ function connectToServer() {
         } else {
           visitUrl(message.url, message.stayTime || 3, message.takeScreenshot || false);
         }
+      } else if (message.type === 'END_VISIT') {
+        if (finishStay) {
+          clearTimeout(currentNavigationStayTimeoutId);
+          finishStay();
+        }
       } else if (message.type === 'reset') {
         resetBrowser();
       } else if (message.type === 'checkReady') {
@@ -159,6 +166,7 @@ function visitUrl(url, stayTime = 3, screenshot = false) {
     clearTimeout(currentNavigationStayTimeoutId);
     currentNavigationStayTimeoutId = null;
   }
+  finishStay = null;
   
   // Remove any lingering about:blank listener from a previous cycle
   cleanupAboutBlankListener();
@@ -215,6 +223,7 @@ function handleNavigationError(url, errorMessage) {
     currentNavigationStayTimeoutId = null;
   }
   
+  finishStay = null; // The stay after an error always runs to its end
   timerActive = true; 
   
   sendToServer({
@@ -287,11 +296,13 @@ browser.webNavigation.onCompleted.addListener(details => {
     
     if (currentNavigationStayTimeoutId) clearTimeout(currentNavigationStayTimeoutId);
 
-    currentNavigationStayTimeoutId = setTimeout(() => {
+    finishStay = () => {
       timerActive = false; // Explicitly reset before finalizeCycle
       currentNavigationStayTimeoutId = null;
+      finishStay = null;
       finalizeCycle(details.url, null); // null for errorInfo means success
-    }, stayTimeMs);
+    };
+    currentNavigationStayTimeoutId = setTimeout(finishStay, stayTimeMs);
   }
 });
 
@@ -350,12 +350,15 @@ process.stdin.on('readable', () => {
             type: 'VISIT_URL',
             url: data.url,
             stayTime: parseInt(data.visitDuration) || 3,
-            waitingTime: data.waitingTime || 0,
+            // Remaining delay until the planned start (epoch ms), without the stdin delivery delay
+            waitingTime: data.startAt ? Math.max(data.startAt - Date.now(), 0) : (data.waitingTime || 0),
             takeScreenshot: !!screenshotPath // Send screenshot command if path is set
           });
         } catch (error) {
           console.error(`Error parsing visit_url command: ${error.message}`);
         }
+      } else if (command === 'end_visit') {
+        sendCommandToExtension({ type: 'END_VISIT' });
       } else if (command === 'reset') {
         sendCommandToExtension({ type: 'reset' });
       } else if (command === 'shutdown') {
@@ -1,5 +1,8 @@
 const {spawn} = require('child_process');
 const path = require('path');
+const net = require('net');
+const os = require('os');
+const dgram = require('dgram');
 var exkill = require("tree-kill");
 var fs = require('fs');
 const axios = require('axios'); // for HTTP file upload
@@ -32,13 +35,27 @@ let visitedUrlIndex; // Added to store the current URL index
 let totalUrls; // Added to store the total number of URLs for formatting
 
 var harPathGlobal = null; // Stores the full local path to the HAR file
+let proxyControlSocket = null; // Unix socket for proxy control commands, null to use *.proxy.local requests
+let proxyTenant = ""; // Capture session of this worker's browser in the proxy; the listen port when it runs with har_tenant_by=port
+let proxyStandbyPort = null; // Second listen port for the standby browser of OpenWPM (standby_browsers), null without
 
 var browserFinished = false;
 var proxyClosedPromise = null;
 let urlVisitErrorOccurred = false; // Added to track URL visit errors
 let iterationCompletedEmitted = false; // Prevent duplicate ITERATION_DONE emission per URL
 let visitTimestampMs = null; // Visit timestamp from scheduler (ms since epoch)
+let proxyTimingChannel = null; // UDP socket receiving timing datagrams from the proxy
+let proxyTimings = {}; // Timing events of the current iteration received on proxyTimingChannel
+let flowBudgetExceeded = null; // Reason ("flows" or "bytes") if the proxy summarized flows of the current URL
+let pageLoadTimings = null; // domContentLoaded, load and networkIdle (epoch ms) reported by the crawl script
+let visitStartMs = null; // Planned start of the current visit (Date.now() based), for the network idle policy
+let endVisitTimer = null; // Pending end_visit of the current visit
+let networkIdleAt = null; // Time the proxy reported network idle for the current visit
 let measuredFirstRequestAfterMs = undefined; // Measured by proxy relative to visit
+let clockSamples = []; // Round trip and offset of the recent clock sync samples with the scheduler
+
+// Number of recent scheduler clock samples the offset estimate is taken from
+const CLOCK_SAMPLE_WINDOW = 16;
 
 module.exports =
 {
@@ -151,6 +168,9 @@ module.exports =
                 spawnArgs.push("--crawldatapath", openWpmDataDir);
                 spawnArgs.push("--browserprofilepath", browserProfileDir);
                 spawnArgs.push("--logfilepath", openWpmLogFile);
+                if (worker.network_idle_ms) spawnArgs.push("--network_idle_ms", worker.network_idle_ms);
+                if (worker.standby_browsers) spawnArgs.push("--standby_browsers");
+                if (worker.early_browser_ready) spawnArgs.push("--early_ready");
 
                 //spawnArgs.push("--page_load_timeout", 30); // todo variable
 
@@ -199,6 +219,13 @@ module.exports =
                     console.log(colorize("TIMESTAMP:", "cyan") + " Elapsed time since first request: " + elapsedSeconds.toFixed(2) + " seconds");
                     process.emit('scriptUrlDoneRelay');
                     console.log(colorize("SOCKETIO:", "cyan") + " Sending URL_DONE (via process event)");
+                } else if (line.startsWith("PAGE_LOAD")) {
+                    const pageLoadMatch = line.match(/^PAGE_LOAD (.+)$/);
+                    try {
+                        pageLoadTimings = pageLoadMatch ? JSON.parse(pageLoadMatch[1]) : null;
+                    } catch (error) {
+                        console.error(colorize("ERROR: ", "red") + "Failed to parse PAGE_LOAD timings:", error);
+                    }
                 } else if (line.includes("BROWSER_FINISHED")) {
                     if (iterationCompletedEmitted) {
                         if (PROXY_DEBUG_OUTPUT) {
@@ -208,6 +235,8 @@ module.exports =
                     }
                     iterationCompletedEmitted = true;
                     browserFinished = true;
+                    clearTimeout(endVisitTimer);
+                    endVisitTimer = null;
                     let processingError = null;
                     let finalHarPath = null;
 
@@ -227,7 +256,11 @@ module.exports =
                         harPath: finalHarPath,
                         urlVisitError: urlVisitErrorOccurred,
                         processingError: processingError,
-                        firstRequestAfterMs: measuredFirstRequestAfterMs
+                        firstRequestAfterMs: measuredFirstRequestAfterMs,
+                        proxyTimings: proxyTimings,
+                        flowBudgetExceeded: flowBudgetExceeded,
+                        pageLoadTimings: pageLoadTimings,
+                        networkIdleAt: networkIdleAt
                     };
                     process.emit('scriptIterationDone', iterationData);
                     console.log(colorize("INFO:", "gray") + " Emitted scriptIterationDone event with data: ", iterationData);
@@ -237,7 +270,14 @@ module.exports =
                     browserFinished = false;
                     proxyClosedPromise = null;
                 } else if (line.includes("browser_ready")) {
-                    process.emit('scriptBrowserReadyRelay', worker.client_name);
+                    // Python crawl scripts append the duration of a preceding restart
+                    const restartMatch = line.match(/restart_ms=(\d+)/);
+                    // With standbys the proxy port (and so the tenant) changes with every swap
+                    const proxyPortMatch = line.match(/proxy_port=(\d+)/);
+                    if (proxyPortMatch && proxyStandbyPort) {
+                        proxyTenant = proxyPortMatch[1];
+                    }
+                    process.emit('scriptBrowserReadyRelay', worker.client_name, restartMatch ? Number(restartMatch[1]) : undefined);
                     console.log(colorize("SOCKETIO:", "cyan") + " Sending browser_ready (via process event)");
 
                 } else if (line.includes("URL_ERROR")) {
@@ -325,6 +365,15 @@ module.exports =
         return module;
     },
 
+    // NTP-style sample: t0/t3 are the local send/receive times of a clock sync request,
+    // t1/t2 the scheduler's receive/reply times (all epoch ms)
+    addClockSample: function ({ t0, t1, t2, t3 }) {
+        const rtt = (t3 - t0) - (t2 - t1);
+        if (rtt < 0) return;
+        clockSamples.push({ rtt: rtt, offset: ((t1 - t0) + (t2 - t3)) / 2 });
+        if (clockSamples.length > CLOCK_SAMPLE_WINDOW) clockSamples.shift();
+    },
+
     checkBrowserReady: function () {
         if (browser && browser.stdin) {
             browser.stdin.write("check_readiness\n");
@@ -341,25 +390,34 @@ module.exports =
         urlVisitErrorOccurred = false; // Reset error flag for new URL
         iterationCompletedEmitted = false; // Reset duplicate guard for new iteration
         measuredFirstRequestAfterMs = undefined; // Reset measured first request
+        proxyTimings = {}; // Reset proxy timing events
+        flowBudgetExceeded = null; // Reset flow budget state
+        pageLoadTimings = null; // Reset page load timestamps
+        clearTimeout(endVisitTimer);
+        endVisitTimer = null;
+        networkIdleAt = null;
         visitTimestampMs = IterationConfig.visitTimestamp ? Date.parse(IterationConfig.visitTimestamp) : null;
         
         // Clear previous flows from proxy before visiting the new URL
         await this.clearHarFlows();
         
         if (browser && browser.stdin) {
-            let jsonSignal = "visit_url" + JSON.stringify(IterationConfig) + "\n";
+            // The scheduler's targetTime is converted to this host's clock here. Crawl scripts
+            // start at startAt (local epoch ms) so the stdin delivery delay doesn't shift the
+            // start; waitingTime is the same delay relative to now, for scripts without startAt.
+            const { targetTime, ...visitCommand } = IterationConfig;
+            visitCommand.waitingTime = visitWaitingTime(targetTime, IterationConfig.waitingTime || 0);
+            visitStartMs = Date.now() + visitCommand.waitingTime;
+            visitCommand.startAt = visitStartMs;
+            let jsonSignal = "visit_url" + JSON.stringify(visitCommand) + "\n";
             browser.stdin.write(jsonSignal);
             // If proxy is active and a unified visit timestamp is provided, forward it for HAR pages metadata
             if (worker.enable_proxy && IterationConfig.visitTimestamp) {
                 try {
-                    await axios.get('http://setpage.proxy.local/', {
-                        proxy: { host: worker.proxy_host, port: worker.proxy_port, protocol: 'http' },
-                        headers: {
-                            'X-Page-Url': IterationConfig.clearUrl,
-                            'X-Visit-Timestamp': IterationConfig.visitTimestamp,
-                            'X-Url-Index': String(IterationConfig.urlIndex || '')
-                        },
-                        timeout: 2000
+                    await sendProxyControl("setpage", {
+                        'X-Page-Url': IterationConfig.clearUrl,
+                        'X-Visit-Timestamp': IterationConfig.visitTimestamp,
+                        'X-Url-Index': String(IterationConfig.urlIndex || '')
                     }).catch(() => {});
                 } catch (e) { /* ignore */ }
             }
@@ -430,6 +488,10 @@ module.exports =
             // Only kill proxy if exiting
             if (worker.enable_proxy && exiting){
                 await killProxy();
+                if (proxyTimingChannel) {
+                    proxyTimingChannel.close();
+                    proxyTimingChannel = null;
+                }
             }
 
             //if (worker.enable_proxy) proxy.kill("SIGINT"); // proxyfix
@@ -588,6 +650,8 @@ module.exports =
             console.log(colorize("MITMPROXY:", "magenta") + " Proxy already running with PID:", proxy.pid);
             return Promise.reject(new Error("Proxy already running"));
         }
+
+        const timingPort = baseConfig.proxy_timing_channel ? await openProxyTimingChannel() : null;
         
         return new Promise((resolve, reject) => {
 
@@ -596,17 +660,37 @@ module.exports =
 
             console.log(colorize("INFO:", "gray") + " MASTER DOMAIN: ", masterDomain);
 
+            proxyControlSocket = baseConfig.proxy_control_socket
+                ? path.join(os.tmpdir(), `bsync_proxy_${worker.proxy_port}.sock`)
+                : null;
+
+            // A standby browser warms up on the next port; by-port tenants keep its startup
+            // traffic out of the active browser's HAR and events
+            proxyStandbyPort = worker.standby_browsers ? Number(worker.proxy_port) + 1 : null;
+            proxyTenant = proxyStandbyPort ? String(worker.proxy_port) : "";
+            const listenArgs = proxyStandbyPort
+                ? ["--mode=regular@" + worker.proxy_port, "--mode=regular@" + proxyStandbyPort, "--set=har_tenant_by=port"]
+                : ["--listen-port=" + worker.proxy_port];
+
             try{ 
         
                 proxy = spawn("mitmdump", [
                     "--listen-host=" + worker.proxy_host,
-                    "--listen-port=" + worker.proxy_port, 
+                    ...listenArgs,
                     // Load custom script to save HAR files and control proxy in runtime
                     "-s /home/user/Downloads/bsync/Client/proxy/proxyController.py",
                     "-v",
                     //"--set=console_eventlog_verbosity=info", 
                     "--set=console_eventlog_verbosity=warn", 
                     "--set=termlog_verbosity=warn",
+                    "--set=har_compression=" + (baseConfig.har_compression || "none"),
+                    "--set=har_compression_level=" + (baseConfig.har_compression_level ?? -1),
+                    ...(proxyControlSocket ? ["--set=har_control_socket=" + proxyControlSocket] : []),
+                    ...(baseConfig.har_stream_dir ? ["--set=har_stream_dir=" + baseConfig.har_stream_dir] : []),
+                    ...(timingPort ? ["--set=har_timing_addr=127.0.0.1:" + timingPort] : []),
+                    "--set=har_flow_limit=" + (baseConfig.har_flow_limit || 0),
+                    "--set=har_flow_bytes_limit=" + (baseConfig.har_flow_bytes_limit || 0),
+                    "--set=har_network_idle_ms=" + (baseConfig.end_visit_on_network_idle ? (baseConfig.proxy_network_idle_ms || 0) : 0),
                     //"--set=hardump=" + fileSaveDir + replaceDotWithUnderscore(clearUrl) + ".har" // alt
                     // TODO for bugfixing
                     //"--dumper_filter=" + config.activeConfig.base.master_addr + "*",
@@ -640,7 +724,7 @@ module.exports =
     
             //Promise.resolve().then(console.log("MITMPROXY: Spawned instance PID: ", proxy.pid)); // moved to check if proxy is ready
 
-            console.log(colorize("STATUS:", "green") + " Spawned Proxy instance PID:", proxy.pid, "listening to " + worker.proxy_host+ ":" + worker.proxy_port);
+            console.log(colorize("STATUS:", "green") + " Spawned Proxy instance PID:", proxy.pid, "listening to " + worker.proxy_host+ ":" + worker.proxy_port + (proxyStandbyPort ? " and :" + proxyStandbyPort + " (standby)" : ""));
 
             proxy.stderr.on("data", async(err) => {
 
@@ -740,7 +824,8 @@ module.exports =
             console.error(colorize("ERROR:", "red") + " Failed to create local URL HAR directory (localUrlHarDir is falsy). Cannot set HAR dump path.");
             return null;
         }
-        const harFileName = `${fileSystemUtils.formatUrlIndex(urlIndex, totalUrls)}_${fileSystemUtils.replaceDotWithUnderscore(clearUrl)}.har`;
+        const harFileExtension = baseConfig.har_file_extension || ".har"; // Selects the proxy's output format
+        const harFileName = `${fileSystemUtils.formatUrlIndex(urlIndex, totalUrls)}_${fileSystemUtils.replaceDotWithUnderscore(clearUrl)}${harFileExtension}`;
         const localHarPath = path.join(localUrlHarDir, harFileName);
 
         console.log(colorize("STATUS:", "green") + " Setting hardump path to: " + localHarPath);
@@ -759,12 +844,14 @@ module.exports =
                         try {
                             const message = JSON.parse(jsonString);
                             if (message.type === "har_path_set") {
-                                console.log(colorize("DEBUG:", "cyan") + ` [setHarDumpPath listener] Resolving with localHarPath: ${localHarPath}`);
-                                console.log(colorize("MITMPROXY:", "magenta") + " HAR path set by proxy confirmation received for: " + localHarPath);
+                                // The proxy may append a compression suffix (e.g. .har.zst), so use the path it reports
+                                const proxyHarPath = (message.data && message.data.har_path) || localHarPath;
+                                console.log(colorize("DEBUG:", "cyan") + ` [setHarDumpPath listener] Resolving with proxyHarPath: ${proxyHarPath}`);
+                                console.log(colorize("MITMPROXY:", "magenta") + " HAR path set by proxy confirmation received for: " + proxyHarPath);
                                 proxy.stdout.removeListener('data', listener);
-                                harPathGlobal = localHarPath;
+                                harPathGlobal = proxyHarPath;
                                 clearTimeout(proxySetHarDumpPathTimeoutId);
-                                resolve(localHarPath);
+                                resolve(proxyHarPath);
                                 return;
                             }
                         } catch (error) {
@@ -792,16 +879,9 @@ module.exports =
                 reject(new Error('Timeout waiting for HAR path set confirmation'));
             }, 3000);
 
-            axios.get('http://hardumppath.proxy.local/', {
-                proxy: {
-                    host: worker.proxy_host,
-                    port: worker.proxy_port,
-                    protocol: 'http'
-                },
-                headers: {
-                    'X-Har-Path': localHarPath
-                }
-            }).catch(err => {
+            sendProxyControl("hardumppath", {
+                'X-Har-Path': localHarPath
+            }, 0).catch(err => {
                 // console.log("Failed to send harpath request:",); //err); DEBUG
             });
 
@@ -876,14 +956,8 @@ module.exports =
                 reject(new Error(errorMsg));
             }, 3000);
 
-            console.log(colorize("MITMPROXY:", "magenta") + " Sending HTTP clearflows request to proxy");
-            axios.get('http://clearflows.proxy.local/', {
-                proxy: {
-                    host: worker.proxy_host,
-                    port: worker.proxy_port,
-                    protocol: 'http'
-                }
-            }).catch(err => { 
+            console.log(colorize("MITMPROXY:", "magenta") + " Sending clearflows request to proxy");
+            sendProxyControl("clearflows", {}, 0).catch(err => { 
                 // This error is expected as the proxy doesn't send a proper HTTP response,
                 // we are waiting for the IPC message instead.
             });
@@ -932,18 +1006,134 @@ module.exports =
 }
 
 
-// Send HTTP request to proxy to trigger hardump function
-async function exportHar() {
-    if (!proxy && !proxy.stdin) return;
-    console.log("Sending HTTP hardump request to proxy");
-    // Send HTTP request to trigger hardump test todo
-    axios.get('http://harddump.proxy.local/', {
+// Proxy timing channel event codes, see TimingChannel in proxy/proxyController.py
+const PROXY_TIMING_EVENTS = {
+    1: "firstRequest",
+    2: "firstResponseByte",
+    3: "exportQueued",
+    4: "exportCompleted"
+};
+
+// Open the loopback UDP socket the proxy sends timing datagrams to, resolves with its port
+function openProxyTimingChannel() {
+    if (proxyTimingChannel) {
+        return Promise.resolve(proxyTimingChannel.address().port);
+    }
+    return new Promise((resolve, reject) => {
+        const socket = dgram.createSocket('udp4');
+        socket.on('message', handleProxyTimingDatagram);
+        socket.once('error', reject);
+        socket.bind(0, '127.0.0.1', () => {
+            proxyTimingChannel = socket;
+            resolve(socket.address().port);
+        });
+    });
+}
+
+// Datagram layout (little-endian): u8 event, u32 generation, i64 monotonic ns and f64 wall clock
+// seconds taken together when sending, f64 wall clock seconds of the event, UTF-8 tenant
+function handleProxyTimingDatagram(msg) {
+    if (msg.length < 29) return;
+    const name = PROXY_TIMING_EVENTS[msg.readUInt8(0)];
+    if (!name || msg.toString('utf8', 29) !== proxyTenant) return;
+    const timing = {
+        generation: msg.readUInt32LE(1),
+        monotonicMs: Number(msg.readBigInt64LE(5)) / 1e6,
+        wallMs: msg.readDoubleLE(13) * 1000,
+        eventMs: msg.readDoubleLE(21) * 1000,
+        receivedMs: Date.now()
+    };
+    proxyTimings[name] = timing;
+    if (name === "firstRequest") {
+        recordFirstRequest(timing.eventMs);
+    }
+}
+
+// End the current visit after network idle, but not before visit_min_duration; the crawl
+// script still ends it after the visit duration otherwise. The policy is the same for all
+// frameworks, each crawl script handles the end_visit command.
+function scheduleEndVisit() {
+    if (!baseConfig.end_visit_on_network_idle || visitStartMs === null || endVisitTimer || browserFinished) return;
+    const minStayMs = (baseConfig.visit_min_duration || 0) * 1000;
+    const delay = Math.max(visitStartMs + minStayMs - Date.now(), 0);
+    endVisitTimer = setTimeout(() => {
+        if (browser && browser.stdin && !browserFinished) {
+            console.log(colorize("INFO:", "gray") + " Network idle, ending visit");
+            browser.stdin.write("end_visit\n");
+        }
+    }, delay);
+}
+
+// Delay from now until targetTime (scheduler epoch ms) + waitingTime, using the offset of the
+// clock sync sample with the lowest round trip. Without a target or samples waitingTime is used.
+function visitWaitingTime(targetTime, waitingTime) {
+    if (targetTime === null || targetTime === undefined) return waitingTime;
+    if (clockSamples.length === 0) {
+        console.warn(colorize("WARN:", "yellow") + " targetTime given but no clock samples yet, using waitingTime");
+        return waitingTime;
+    }
+    const best = clockSamples.reduce((a, b) => (b.rtt < a.rtt ? b : a));
+    const remainingMs = targetTime + waitingTime - best.offset - Date.now();
+    console.log(colorize("INFO:", "gray") + ` Target time: ${targetTime}, clock offset: ${best.offset} ms (rtt ${best.rtt} ms), starting in ${Math.round(remainingMs)} ms`);
+    if (remainingMs < 0) {
+        console.warn(colorize("WARN:", "yellow") + ` Visit target passed ${-Math.round(remainingMs)} ms ago, starting now`);
+    }
+    return Math.max(Math.round(remainingMs), 0);
+}
+
+// Store the delay of the first proxied request after the scheduler-provided visit timestamp
+function recordFirstRequest(reqTsMs) {
+    if (measuredFirstRequestAfterMs !== undefined) return; // Timing channel and IPC report the same request
+    if (visitTimestampMs && reqTsMs && reqTsMs >= visitTimestampMs) {
+        measuredFirstRequestAfterMs = reqTsMs - visitTimestampMs;
+        if (PROXY_DEBUG_OUTPUT) {
+            console.log(colorize("DEBUG:", "gray") + ` Measured first request after: ${measuredFirstRequestAfterMs} ms`);
+        }
+    }
+}
+
+// Send a control command for proxyTenant to the proxy. Uses the control socket if enabled, which
+// skips the proxy pipeline, and otherwise a request to http://<command>.proxy.local/ through the proxy.
+// A timeout of 0 means no timeout.
+function sendProxyControl(command, headers = {}, timeout = 2000) {
+    if (proxyControlSocket) {
+        return new Promise((resolve, reject) => {
+            const socket = net.createConnection(proxyControlSocket, () => {
+                socket.write(JSON.stringify({ command: command, headers: headers, tenant: proxyTenant }) + "\n");
+            });
+            if (timeout) {
+                socket.setTimeout(timeout, () => socket.destroy(new Error(`Control socket timeout for ${command}`)));
+            }
+            socket.once('data', (data) => {
+                socket.end();
+                try {
+                    const reply = JSON.parse(data.toString());
+                    reply.ok ? resolve(reply) : reject(new Error(reply.error));
+                } catch (error) {
+                    reject(error);
+                }
+            });
+            socket.on('error', reject);
+        });
+    }
+    // With har_tenant_by=port the port a request comes in on selects its session
+    return axios.get(`http://${command}.proxy.local/`, {
         proxy: {
             host: worker.proxy_host,
-            port: worker.proxy_port,
+            port: proxyTenant ? Number(proxyTenant) : worker.proxy_port,
             protocol: 'http'
-        }
-    }).catch(err => {
+        },
+        headers: headers,
+        timeout: timeout
+    });
+}
+
+// Send control request to proxy to trigger hardump function
+async function exportHar() {
+    if (!proxy && !proxy.stdin) return;
+    console.log("Sending hardump request to proxy");
+    // Send HTTP request to trigger hardump test todo
+    sendProxyControl("harddump", {}, 0).catch(err => {
         // console.log("Failed to send hardump request:",); //err); DEBUG
     });
 }
@@ -981,9 +1171,17 @@ async function saveHarToNfs(clearUrlForNfs) {
             fs.copyFileSync(harPathGlobal, remoteNfsHarPath);
             console.log(colorize("STATUS:", "green") + ` HAR file successfully saved to NFS at ${remoteNfsHarPath}`);
 
+            // Late flows of earlier URLs (har_late_flows=sidecar) are written next to the HAR
+            const latePath = harPathGlobal + ".late.jsonl";
+            const hasLateSidecar = fs.existsSync(latePath);
+            if (hasLateSidecar) {
+                fs.copyFileSync(latePath, remoteNfsHarPath + ".late.jsonl");
+            }
+
             // Optionally delete the local HAR file
             if (baseConfig.delete_after_upload) {
                 fs.unlinkSync(harPathGlobal);
+                if (hasLateSidecar) fs.unlinkSync(latePath);
                 console.log(colorize("STATUS:", "green") + ` Local HAR file deleted: `, harPathGlobal);
             }
 
@@ -1051,14 +1249,7 @@ async function killProxy() {
                 proxy.on("close", closeHandler);
 
                 // Send HTTP request to trigger graceful shutdown
-                axios.get('http://shutdown.proxy.local/', {
-                    proxy: {
-                        host: worker.proxy_host,
-                        port: worker.proxy_port,
-                        protocol: 'http'
-                    },
-                    timeout: 2000 // Add timeout to HTTP request
-                }).catch(err => {
+                sendProxyControl("shutdown").catch(err => {
                     // Expecting this to fail as the proxy shuts down
                     console.log(colorize("INFO:", "gray") + " Graceful shutdown request completed (expected)");
                 });
@@ -1105,6 +1296,9 @@ async function killProxy() {
     }
 }
 
+// Proxy IPC messages about the traffic of one client, filtered by proxyTenant
+const TENANT_EVENTS = new Set(["first_request_detected", "network_idle", "network_busy", "flow_budget_exceeded"]);
+
 /**
  * Process JSON IPC messages from the proxy
  * @param {string} jsonString - The JSON string to parse
@@ -1114,6 +1308,14 @@ function processProxyIpcMessage(jsonString) {
         const message = JSON.parse(jsonString);
         const { type, data, timestamp, debug } = message;
 
+        // Events of other proxy clients (e.g. a warming standby browser) don't belong to this visit
+        if (TENANT_EVENTS.has(type) && data && data.tenant !== undefined && data.tenant !== proxyTenant) {
+            if (PROXY_DEBUG_OUTPUT) {
+                console.log(colorize("MITMPROXY:", "magenta") + ` Ignoring ${type} of proxy client "${data.tenant}"`);
+            }
+            return message;
+        }
+
         // Log the message type with timestamp - REMOVED to avoid duplicate output
         // console.log(colorize("MITMPROXY:", "magenta") + ` [${type}]` + (debug ? ` ${debug}` : ""));
 
@@ -1127,17 +1329,63 @@ function processProxyIpcMessage(jsonString) {
                 console.log(colorize("MITMPROXY:", "magenta") + " Proxy addon loaded");
                 break;
 
+            case "har_export_queued":
+                if (PROXY_DEBUG_OUTPUT) {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` HAR export queued with ${data.flows_count} flows (queue depth ${data.queue_depth})`);
+                }
+                if (data.late_flows) {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` ${data.late_flows} flows of earlier iterations completed during this one and were kept out of its HAR`);
+                }
+                break;
+
+            case "late_flow":
+                if (PROXY_DEBUG_OUTPUT) {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` Late flow ${data.url} belongs to ${data.har_path}`);
+                }
+                break;
+
+            case "har_export_backlog":
+                console.warn(colorize("WARN:", "yellow") + ` ${data.queue_depth} HAR exports waiting for the export thread, the disk does not keep up`);
+                break;
+
             case "har_export_started":
                 console.log(colorize("MITMPROXY:", "magenta") + ` Starting HAR export with ${data.flows_count} flows`);
                 break;
 
             case "har_export_completed":
                 console.log(colorize("MITMPROXY:", "magenta") + ` HAR export completed: ${data.file_path} (${fileSystemUtils.prettySize(data.file_size)})`); // Use function from fileSystemUtils
+                if (data.streamed) {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` Streamed capture finalized with ${data.flows_exported} flows`);
+                }
+                if (data.codec && data.codec !== "none") {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` Compressed with ${data.codec} level ${data.compression_level} in ${data.compression_time_ms} ms (${fileSystemUtils.prettySize(data.uncompressed_size)} uncompressed)`);
+                }
                 if (PROXY_DEBUG_OUTPUT) {
                     console.log(colorize("MITMPROXY:", "magenta") + ` Flows before/after clear: ${data.flows_before_clear}/${data.flows_after_clear}`);
                 }
                 break;
 
+            case "proxy_metrics":
+                if (PROXY_DEBUG_OUTPUT) {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` Metrics (${data.trigger}): ${data.flows_completed} flows, ${data.flows_per_second} flows/s`);
+                    for (const [hook, stats] of Object.entries(data.hooks || {})) {
+                        console.log(colorize("MITMPROXY:", "magenta") + `   ${hook}: n=${stats.count} p50=${stats.p50_us}us p95=${stats.p95_us}us p99=${stats.p99_us}us max=${stats.max_us}us`);
+                    }
+                }
+                break;
+
+            case "control_socket_ready":
+                if (PROXY_DEBUG_OUTPUT) {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` Control socket listening on ${data.path}`);
+                }
+                break;
+
+            case "har_spool_started":
+                if (PROXY_DEBUG_OUTPUT) {
+                    console.log(colorize("MITMPROXY:", "magenta") + ` Spooling entries of iteration ${data.generation} to ${data.spool_path}`);
+                }
+                break;
+
             case "hardump_requested":
                 console.log(colorize("MITMPROXY:", "magenta") + ` HAR dump requested (${data.flows_count} flows)`);
                 break;
@@ -1145,6 +1393,9 @@ function processProxyIpcMessage(jsonString) {
             case "har_path_set":
                 if (PROXY_DEBUG_OUTPUT) {
                     console.log(colorize("MITMPROXY:", "magenta") + ` HAR path set: ${data.har_path}`);
+                    if (data.spool_path) {
+                        console.log(colorize("MITMPROXY:", "magenta") + ` Entries are spooled to ${data.spool_path} until the export`);
+                    }
                 }
                 break;
 
@@ -1153,15 +1404,37 @@ function processProxyIpcMessage(jsonString) {
                 // Compute delta from scheduler-provided visit timestamp if available
                 try {
                     const reqTsMs = (data && typeof data.timestamp === 'number') ? Math.round(data.timestamp * 1000) : null;
-                    if (visitTimestampMs && reqTsMs && reqTsMs >= visitTimestampMs) {
-                        measuredFirstRequestAfterMs = reqTsMs - visitTimestampMs;
-                        if (PROXY_DEBUG_OUTPUT) {
-                            console.log(colorize("DEBUG:", "gray") + ` Measured first request after: ${measuredFirstRequestAfterMs} ms`);
-                        }
-                    }
+                    recordFirstRequest(reqTsMs);
                 } catch (e) { /* ignore */ }
                 break;
 
+            case "network_idle": {
+                const idleSinceMs = Math.round(data.idle_since * 1000);
+                // Quiet before the visit started (background traffic after clearflows) says nothing about the page
+                if (visitStartMs === null || idleSinceMs < visitStartMs) {
+                    if (PROXY_DEBUG_OUTPUT) {
+                        console.log(colorize("MITMPROXY:", "magenta") + " Ignoring network idle from before the visit start");
+                    }
+                    break;
+                }
+                networkIdleAt = idleSinceMs;
+                console.log(colorize("MITMPROXY:", "magenta") + ` Network idle for ${data.quiet_ms} ms after ${data.flows_count} flows`);
+                scheduleEndVisit();
+                break;
+            }
+
+            case "network_busy":
+                // New traffic after a reported idle; the proxy reports the next idle period
+                networkIdleAt = null;
+                clearTimeout(endVisitTimer);
+                endVisitTimer = null;
+                break;
+
+            case "flow_budget_exceeded":
+                flowBudgetExceeded = data.reason;
+                console.log(colorize("MITMPROXY:", "magenta") + colorize(` Flow budget exceeded (${data.reason}) after ${data.flows_count} flows, further flows are only summarized`, "red"));
+                break;
+
             case "flows_cleared":
                 if (PROXY_DEBUG_OUTPUT) {
                     console.log(colorize("MITMPROXY:", "magenta") + ` Flows cleared: ${data.flows_before_clear} -> ${data.flows_after_clear}`);
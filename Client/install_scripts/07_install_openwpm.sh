@@ -119,6 +119,19 @@ else
     echo "WARNING: bsync OpenWPM script ($BSYNC_OPENWPM_SCRIPT_SOURCE) not found. Copying skipped."
 fi
 
+# Copy the profile template cache next to deploy_firefox.py, which imports it
+# (both the OpenWPM and the StealthyWPM variant of deploy_firefox.py need it)
+BSYNC_PROFILE_TEMPLATES_SOURCE="$BASE_SCRIPT_DIR/OpenWPM/profile_templates.py"
+BSYNC_PROFILE_TEMPLATES_DEST="/home/$USER/Desktop/OpenWPM/openwpm/deploy_browsers/profile_templates.py"
+
+if [ -f "$BSYNC_PROFILE_TEMPLATES_SOURCE" ]; then
+    echo "Copying bsync profile template cache ($BSYNC_PROFILE_TEMPLATES_SOURCE) to ($BSYNC_PROFILE_TEMPLATES_DEST)..."
+    cp "$BSYNC_PROFILE_TEMPLATES_SOURCE" "$BSYNC_PROFILE_TEMPLATES_DEST"
+    echo "bsync profile template cache copied."
+else
+    echo "WARNING: bsync profile template cache ($BSYNC_PROFILE_TEMPLATES_SOURCE) not found. Copying skipped."
+fi
+
 cd "$BASE_SCRIPT_DIR/.." # Back to the original working directory or a safe location
 
 echo "Module 07: OpenWPM installation complete." 
\ No newline at end of file
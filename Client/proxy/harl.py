@@ -0,0 +1,222 @@
+"""
+harl.py
+Columnar capture format for bsync HAR exports (.harl)
+
+A .harl file is a zstd-compressed stream of JSON lines:
+    line 1:   header with format, version, column names and the HAR "log"
+              object without its entries (version, creator, pages)
+    line 2..: blocks of up to BLOCK_SIZE entries, each holding one value
+              array per column plus a "rest" array with whatever part of
+              each entry is not covered by a column
+
+The columns hold the fields used for cross-crawl analysis (url, method,
+status, sizes, timings, server IP, header names/values), so they can be
+read without rebuilding every entry. Splitting an entry into columns and
+rest is lossless; harl_to_har() restores the HAR 1.2 document.
+
+Usage: python harl.py input.harl [output.har] [--dict zstd.dict]
+"""
+
+import argparse
+import io
+import json
+import sys
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import Any
+
+import zstandard
+
+FORMAT = "bsync-harl"
+VERSION = 1
+
+# Entries per block; bounds the memory of writer and reader
+BLOCK_SIZE = 256
+
+# Scalar fields stored as columns. A null value means the field was absent.
+COLUMNS: tuple[tuple[str, ...], ...] = (
+    ("startedDateTime",),
+    ("time",),
+    ("request", "method"),
+    ("request", "url"),
+    ("request", "httpVersion"),
+    ("request", "headersSize"),
+    ("request", "bodySize"),
+    ("response", "status"),
+    ("response", "statusText"),
+    ("response", "httpVersion"),
+    ("response", "headersSize"),
+    ("response", "bodySize"),
+    ("response", "content", "size"),
+    ("response", "content", "mimeType"),
+    ("response", "redirectURL"),
+    ("timings", "connect"),
+    ("timings", "ssl"),
+    ("timings", "send"),
+    ("timings", "wait"),
+    ("timings", "receive"),
+    ("serverIPAddress",),
+)
+
+# Header lists stored as two columns of parallel name/value arrays
+HEADER_COLUMNS: tuple[tuple[str, ...], ...] = (
+    ("request", "headers"),
+    ("response", "headers"),
+)
+
+
+def column_names() -> list[str]:
+    names = [".".join(path) for path in COLUMNS]
+    for path in HEADER_COLUMNS:
+        names.append(".".join(path) + ".name")
+        names.append(".".join(path) + ".value")
+    return names
+
+
+def _pop_path(entry: dict, path: tuple[str, ...]) -> Any:
+    node = entry
+    for key in path[:-1]:
+        node = node.get(key)
+        if not isinstance(node, dict):
+            return None
+    return node.pop(path[-1], None)
+
+
+def _set_path(entry: dict, path: tuple[str, ...], value: Any) -> None:
+    node = entry
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+
+
+class HarlEncoder:
+    """
+    Incremental .harl encoder. Writes the header immediately and one block
+    per BLOCK_SIZE entries to write(); call close() to flush the last block.
+    Compression is up to the caller.
+    """
+
+    def __init__(self, write: Callable[[bytes], None], log: dict, block_size: int = BLOCK_SIZE) -> None:
+        self._write = write
+        self.block_size = block_size
+        self._names = column_names()
+        header = {
+            "format": FORMAT,
+            "version": VERSION,
+            "columns": self._names,
+            "log": {key: value for key, value in log.items() if key != "entries"},
+        }
+        self._write(json.dumps(header).encode() + b"\n")
+        self._reset_block()
+
+    def _reset_block(self) -> None:
+        self._columns: dict[str, list] = {name: [] for name in self._names}
+        self._rest: list[dict] = []
+
+    def add(self, entry: dict) -> None:
+        """Add one HAR entry. The entry is taken apart, don't reuse it afterwards."""
+        for path in COLUMNS:
+            self._columns[".".join(path)].append(_pop_path(entry, path))
+        for path in HEADER_COLUMNS:
+            headers = _pop_path(entry, path)
+            prefix = ".".join(path)
+            if headers is None:
+                self._columns[prefix + ".name"].append(None)
+                self._columns[prefix + ".value"].append(None)
+            else:
+                self._columns[prefix + ".name"].append([h["name"] for h in headers])
+                self._columns[prefix + ".value"].append([h["value"] for h in headers])
+        self._rest.append(entry)
+        if len(self._rest) >= self.block_size:
+            self._flush_block()
+
+    def _flush_block(self) -> None:
+        if self._rest:
+            block = {"count": len(self._rest), "columns": self._columns, "rest": self._rest}
+            self._write(json.dumps(block).encode() + b"\n")
+            self._reset_block()
+
+    def close(self) -> None:
+        self._flush_block()
+
+
+def _read_lines(path: str, zstd_dict: zstandard.ZstdCompressionDict | None = None) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        reader = zstandard.ZstdDecompressor(dict_data=zstd_dict).stream_reader(f)
+        for line in io.TextIOWrapper(reader, encoding="utf-8"):
+            if line.strip():
+                yield json.loads(line)
+
+
+def _check_header(header: dict, path: str) -> dict:
+    if header.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a {FORMAT} file")
+    if header.get("version") != VERSION:
+        raise ValueError(f"Unsupported {FORMAT} version {header.get('version')} in {path}")
+    return header
+
+
+def read_header(path: str, zstd_dict: zstandard.ZstdCompressionDict | None = None) -> dict:
+    return _check_header(next(_read_lines(path, zstd_dict)), path)
+
+
+def iter_blocks(path: str, zstd_dict: zstandard.ZstdCompressionDict | None = None) -> Iterator[dict]:
+    """
+    Yield the raw column blocks of a .harl file, for analysis without rebuilding entries.
+    Files written with a trained zstd dictionary need the same zstd_dict to be read.
+    """
+    lines = _read_lines(path, zstd_dict)
+    _check_header(next(lines), path)
+    yield from lines
+
+
+def iter_entries(path: str, zstd_dict: zstandard.ZstdCompressionDict | None = None) -> Iterator[dict]:
+    """Yield the HAR entries stored in a .harl file."""
+    for block in iter_blocks(path, zstd_dict):
+        columns = block["columns"]
+        for i, entry in enumerate(block["rest"]):
+            for path_ in COLUMNS:
+                value = columns[".".join(path_)][i]
+                if value is not None:
+                    _set_path(entry, path_, value)
+            for path_ in HEADER_COLUMNS:
+                prefix = ".".join(path_)
+                names = columns[prefix + ".name"][i]
+                if names is not None:
+                    values = columns[prefix + ".value"][i]
+                    _set_path(entry, path_, [
+                        {"name": name, "value": value} for name, value in zip(names, values)
+                    ])
+            yield entry
+
+
+def harl_to_har(path: str, zstd_dict: zstandard.ZstdCompressionDict | None = None) -> dict:
+    """Convert a .harl file back into a HAR 1.2 document."""
+    log = dict(read_header(path, zstd_dict)["log"])
+    log["entries"] = list(iter_entries(path, zstd_dict))
+    return {"log": log}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert a .harl capture back to HAR 1.2")
+    parser.add_argument("input", help=".harl file")
+    parser.add_argument("output", nargs="?", default=None, help="HAR file to write, stdout if omitted")
+    parser.add_argument("--dict", dest="zstd_dict", default=None,
+                        help="Trained zstd dictionary the file was written with")
+    args = parser.parse_args()
+
+    zstd_dict = None
+    if args.zstd_dict:
+        with open(args.zstd_dict, "rb") as f:
+            zstd_dict = zstandard.ZstdCompressionDict(f.read())
+
+    har = harl_to_har(args.input, zstd_dict)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(har, f, indent=4)
+    else:
+        json.dump(har, sys.stdout, indent=4)
+
+
+if __name__ == "__main__":
+    main()
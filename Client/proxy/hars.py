@@ -0,0 +1,138 @@
+"""
+hars.py
+Streamed capture format for bsync HAR exports (.hars)
+
+A .hars file is an append-only file of JSON lines, written while the crawl
+is running so the entries of an iteration are on disk as soon as their
+flows complete:
+    line 1:   header with format and version
+    line 2..: one HAR entry per line, in completion order
+    last:     footer, written at the end of the iteration, with the HAR "log"
+              object without its entries (version, creator, pages), the
+              entry count and the byte offset of every entry line
+
+A file without footer is still being written (or its writer died); its
+entries can be read by tailing it. hars_to_har() restores the HAR 1.2
+document from a complete file.
+
+Usage: python hars.py input.hars [output.har]
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections.abc import Iterator
+from typing import BinaryIO
+
+FORMAT = "bsync-hars"
+VERSION = 1
+
+# Bytes read per step when searching the footer from the end of the file
+_TAIL_CHUNK = 64 * 1024
+
+
+class HarsWriter:
+    """
+    Incremental .hars writer. Every entry is flushed to the file right away
+    so readers tailing it see it; close() writes the footer.
+    """
+
+    def __init__(self, f: BinaryIO) -> None:
+        self._f = f
+        self._index: list[int] = []
+        self._f.write(json.dumps({"format": FORMAT, "version": VERSION}).encode() + b"\n")
+        self._f.flush()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add(self, entry: dict) -> None:
+        self._index.append(self._f.tell())
+        self._f.write(json.dumps(entry).encode() + b"\n")
+        self._f.flush()
+
+    def close(self, log: dict) -> None:
+        """Write the footer for the HAR log object (its entries are ignored) and close the file"""
+        footer = {
+            "log": {key: value for key, value in log.items() if key != "entries"},
+            "count": len(self._index),
+            "index": self._index,
+        }
+        self._f.write(json.dumps({"footer": footer}).encode() + b"\n")
+        self._f.close()
+
+    def abort(self) -> None:
+        """Close the file without a footer"""
+        self._f.close()
+
+
+def _check_header(line: bytes, path: str) -> None:
+    header = json.loads(line) if line.strip() else {}
+    if header.get("format") != FORMAT:
+        raise ValueError(f"{path} is not a {FORMAT} file")
+    if header.get("version") != VERSION:
+        raise ValueError(f"Unsupported {FORMAT} version {header.get('version')} in {path}")
+
+
+def read_footer(path: str) -> dict | None:
+    """Return the footer of a .hars file, None if it is not complete yet."""
+    with open(path, "rb") as f:
+        _check_header(f.readline(), path)
+        end = f.seek(0, os.SEEK_END)
+        # The footer is the last line; read backwards until its start is found
+        tail = b""
+        pos = end
+        while pos > 0:
+            step = min(_TAIL_CHUNK, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            start = tail.rfind(b"\n", 0, len(tail) - 1)
+            if start >= 0:
+                break
+    if not tail.endswith(b"\n"):
+        return None
+    return json.loads(tail[start + 1:]).get("footer")
+
+
+def iter_entries(path: str) -> Iterator[dict]:
+    """Yield the HAR entries written to a .hars file so far."""
+    with open(path, "rb") as f:
+        _check_header(f.readline(), path)
+        for line in f:
+            # A partially written last line of a live spool is skipped
+            if not line.endswith(b"\n"):
+                break
+            item = json.loads(line)
+            if "footer" in item:
+                break
+            yield item
+
+
+def hars_to_har(path: str) -> dict:
+    """Convert a complete .hars file into a HAR 1.2 document."""
+    footer = read_footer(path)
+    if footer is None:
+        raise ValueError(f"{path} has no footer, the capture is not complete")
+    log = dict(footer["log"])
+    log["entries"] = list(iter_entries(path))
+    return {"log": log}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert a .hars capture to HAR 1.2")
+    parser.add_argument("input", help=".hars file")
+    parser.add_argument("output", nargs="?", default=None, help="HAR file to write, stdout if omitted")
+    args = parser.parse_args()
+
+    har = hars_to_har(args.input)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(har, f, indent=4)
+    else:
+        json.dump(har, sys.stdout, indent=4)
+
+
+if __name__ == "__main__":
+    main()
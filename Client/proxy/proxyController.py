@@ -11,14 +11,37 @@ added HTTP control for manually setting har path and export
 
 PROXY_DEBUG = False
 
+# Number of HAR exports waiting for the background export thread above which
+# every further export reports a har_export_backlog warning. The queue itself is
+# unbounded, an export is never dropped and never waits on the event loop.
+HAR_EXPORT_BACKLOG_WARN = 4
+
+import asyncio
 import base64
+import functools
+import itertools
 import json
 import logging
+import os
+import queue
+import re
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
 import zlib
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Mapping
 from collections.abc import Sequence
 from datetime import datetime
 from datetime import timezone
 from typing import Any
+from typing import NamedTuple
 
 from mitmproxy import command
 from mitmproxy import ctx
@@ -35,8 +58,17 @@ from mitmproxy.log import ALERT
 from mitmproxy.utils import human
 from mitmproxy.utils import strutils
 
+import zstandard
+
+# Columnar .harl format, lives next to this script
+import harl
+import hars
+
 logger = logging.getLogger(__name__)
 
+# IPC messages are sent from the event loop and the HAR export thread
+_ipc_lock = threading.Lock()
+
 def send_ipc_message(message_type: str, data: dict = None, debug_msg: str = None):
     """Send structured JSON message for IPC communication with Node.js"""
     message = {
@@ -48,59 +80,899 @@ def send_ipc_message(message_type: str, data: dict = None, debug_msg: str = None
     if debug_msg:
         message["debug"] = debug_msg
     
-    # Send JSON message with special prefix for easy detection
-    print(f"IPC_JSON:{json.dumps(message)}", flush=True)
+    # Send JSON message with special prefix for easy detection.
+    # Written as a single string so lines from different threads never interleave.
+    line = f"IPC_JSON:{json.dumps(message)}\n"
+    with _ipc_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+# Entries sit inside {"log": {"entries": [...]}}, i.e. three levels deep
+HAR_ENTRY_INDENT = 12
+
+
+def _indent_json(obj: Any, indent: int) -> str:
+    """Pretty-print obj as if it was nested `indent` spaces deep in a document"""
+    pad = " " * indent
+    return pad + json.dumps(obj, indent=4).replace("\n", "\n" + pad)
+
+
+# Compression codecs for the HAR export: name -> (file suffix, default level).
+# .zhar (zlib) and .harl (zstd) imply their codec; plain .har paths get the
+# suffix of the codec selected with the har_compression option appended.
+CODECS = {
+    "none": ("", 0),
+    "gzip": (".gz", 6),
+    "zlib": (".zz", 6),
+    "zstd": (".zst", 3),
+    "lz4": (".lz4", 0),
+}
+CODEC_BY_SUFFIX = {".zhar": "zlib", ".harl": "zstd"}
+CODEC_BY_SUFFIX.update((suffix, name) for name, (suffix, _) in CODECS.items() if suffix)
+
+
+def codec_for_path(path: str) -> str:
+    """Codec implied by the HAR file extension"""
+    return CODEC_BY_SUFFIX.get(os.path.splitext(path)[1], "none")
+
+
+class _Lz4Compressor:
+    """Adapts lz4.frame to the compress()/flush() interface of zlib.compressobj"""
+
+    def __init__(self, level: int) -> None:
+        import lz4.frame
+        self._compressor = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self._started = False
+
+    def compress(self, data: bytes) -> bytes:
+        head = b""
+        if not self._started:
+            head = self._compressor.begin()
+            self._started = True
+        return head + self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compress(b"") + self._compressor.flush()
+
+
+def make_compressor(codec: str, level: int = -1, zstd_dict: Any = None) -> Any:
+    """
+    Streaming compressor for codec, None for "none".
+    level -1 selects the codec's default level.
+    """
+    if level < 0:
+        level = CODECS[codec][1]
+    if codec == "none":
+        return None
+    if codec == "zlib":
+        return zlib.compressobj(level)
+    if codec == "gzip":
+        # wbits 16 + 15 writes a gzip header and trailer instead of zlib's
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level, dict_data=zstd_dict).compressobj()
+    if codec == "lz4":
+        return _Lz4Compressor(level)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+class HarFileSink:
+    """
+    Write-only file wrapper used by the streaming HAR export.
+    Optionally compresses on the fly through a compressobj-like object,
+    counting the bytes before and after compression and the time spent
+    compressing.
+    """
+
+    def __init__(self, path: str, compressor: Any = None) -> None:
+        self.path = path
+        self.bytes_in = 0
+        self.bytes_written = 0
+        self.compression_time = 0.0
+        self._fh = open(path, "wb")
+        self._compressor = compressor
+
+    def write(self, data: bytes) -> None:
+        self.bytes_in += len(data)
+        if self._compressor is not None:
+            started = time.perf_counter()
+            data = self._compressor.compress(data)
+            self.compression_time += time.perf_counter() - started
+        if data:
+            self._fh.write(data)
+            self.bytes_written += len(data)
+
+    def close(self) -> None:
+        if self._compressor is not None:
+            started = time.perf_counter()
+            tail = self._compressor.flush()
+            self.compression_time += time.perf_counter() - started
+            self._fh.write(tail)
+            self.bytes_written += len(tail)
+            self._compressor = None
+        self._fh.close()
+
+    def __enter__(self) -> "HarFileSink":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            # Don't flush a compressor trailer onto a broken export
+            self._compressor = None
+        self.close()
+
+
+# Firefox/Mozilla background requests that are never part of a page visit.
+# A leading "*." matches the domain itself and every subdomain.
+DEFAULT_IGNORED_HOSTS = (
+    "detectportal.firefox.com",
+    "firefox.settings.services.mozilla.com",
+    "push.services.mozilla.com",
+    "location.services.mozilla.com",
+    "shavar.services.mozilla.com",
+    "snippets.cdn.mozilla.net",
+    "normandy.cdn.mozilla.net",
+    "aus5.mozilla.org",
+    "content-signature-2.cdn.mozilla.net",
+    "mozilla.cloudflare-dns.com",
+    "*.cdn.mozilla.net",
+)
+
+# Hosts used for HTTP control of the proxy, never recorded
+CONTROL_HOST_SUFFIX = "*.proxy.local"
+
+
+class HostMatcher:
+    """
+    Precompiled host filter.
+    Exact hosts are kept in a frozenset, "*.domain" rules in a trie of
+    reversed domain labels, so a lookup costs one set probe plus one
+    dict step per label regardless of how many rules are loaded.
+    """
+
+    _END = ""  # label marking the end of a suffix rule; real labels are never empty
+
+    def __init__(self, rules: Sequence[str]) -> None:
+        exact = set()
+        self._suffixes: dict = {}
+        for rule in rules:
+            rule = rule.strip().lower()
+            if not rule:
+                continue
+            if rule.startswith("*.") or rule.startswith("."):
+                node = self._suffixes
+                for label in reversed(rule.lstrip("*.").split(".")):
+                    node = node.setdefault(label, {})
+                node[self._END] = True
+            else:
+                exact.add(rule)
+        self._exact = frozenset(exact)
+        self.rule_count = len(self._exact) + self._count_suffixes(self._suffixes)
+
+    @classmethod
+    def _count_suffixes(cls, node: dict) -> int:
+        return sum(
+            1 if label == cls._END else cls._count_suffixes(child)
+            for label, child in node.items()
+        )
+
+    @staticmethod
+    def read_rules(path: str) -> list[str]:
+        """Read one host rule per line; blank lines and # comments are skipped"""
+        with open(path, "r") as f:
+            return [line.split("#", 1)[0].strip() for line in f]
+
+    def __contains__(self, host: str) -> bool:
+        host = host.lower()
+        if host in self._exact:
+            return True
+        node = self._suffixes
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+
+# Serialized size of a HAR entry's fixed fields, and of one header's name/value
+# object on top of the name and value, used by estimate_entry_size
+ENTRY_SIZE_OVERHEAD = 560
+HEADER_SIZE_OVERHEAD = 32
+
+
+def _headers_size(headers: http.Headers) -> int:
+    return sum(len(name) + len(value) + HEADER_SIZE_OVERHEAD for name, value in headers.fields)
+
+
+def estimate_entry_size(flow: http.HTTPFlow, include_payload: bool = False) -> int:
+    """
+    Approximate serialized size of the HAR entry of flow, from the raw URL,
+    header and body lengths. Cheap enough to run for every completed flow,
+    unlike serializing the entry.
+    """
+    request = flow.request
+    # The path stands in for the query string repeated in queryString
+    size = ENTRY_SIZE_OVERHEAD + len(request.url) + len(request.path) + _headers_size(request.headers)
+    if include_payload:
+        # Bodies may end up base64 encoded
+        size += len(request.raw_content or b"") * 4 // 3
+    if flow.response is not None:
+        size += _headers_size(flow.response.headers)
+        if include_payload:
+            size += len(flow.response.raw_content or b"") * 4 // 3
+    return size
+
+
+# A flow reduced to what the HAR needs: (server connection id, HAR entry).
+# The connection id lets the export blank out connect/ssl timings for
+# entries that reused a connection already seen earlier in the HAR.
+FlowRecord = tuple[str | None, dict]
+
+
+class FlowStore:
+    """
+    Per-iteration store of recorded flows, keyed by flow id in recording order.
+
+    Flows are kept as live HTTPFlow objects only while they are in progress.
+    Once a flow is complete it is reduced to a FlowRecord, dropping the
+    mitmproxy objects (and decoded bodies) it references. With a memory
+    budget set, reduced records are spilled to an append-only JSONL segment
+    whenever the in-memory records exceed the budget. With a stream callback
+    set, reduced records are handed to it instead of being kept at all.
+    Record sizes come from the size callback, an estimate from the raw flow
+    (see estimate_entry_size), so no record is serialized just to measure it.
+    """
+
+    def __init__(
+        self,
+        reduce: Callable[[http.HTTPFlow], FlowRecord],
+        memory_budget: int = 0,
+        spill_dir: str | None = None,
+        stream: Callable[[FlowRecord], None] | None = None,
+        size: Callable[[http.HTTPFlow], int] | None = None,
+    ) -> None:
+        self._reduce = reduce
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir or None
+        self._stream = stream
+        # Estimated size of all reduced records, tracked with a memory budget or a size callback
+        self._size = size or (estimate_entry_size if memory_budget > 0 else None)
+        self.retained_bytes = 0
+        # flow id -> live HTTPFlow, reduced FlowRecord, offset into the segment
+        # or None once the record was streamed
+        self._items: dict[str, http.HTTPFlow | FlowRecord | int | None] = {}
+        self._memory_bytes = 0
+        self._segment = None
+        self.segment_path: str | None = None
+        self.spilled_count = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, flow_id: str) -> bool:
+        return flow_id in self._items
+
+    def add(self, flow: http.HTTPFlow, final: bool = False) -> None:
+        """
+        Record or update a flow. With final=True the flow is reduced right away;
+        later non-final updates of a reduced flow are ignored.
+        """
+        if not final:
+            if isinstance(self._items.get(flow.id, flow), http.HTTPFlow):
+                self._items[flow.id] = flow
+            return
+
+        if self._stream is not None:
+            # A streamed record can't be updated anymore
+            if flow.id not in self._items or self._items[flow.id] is not None:
+                self._items[flow.id] = None
+                if self._size is not None:
+                    self.retained_bytes += self._size(flow)
+                self._stream(self._reduce(flow))
+            return
+
+        self._items[flow.id] = self._reduce(flow)
+        if self._size is not None:
+            size = self._size(flow)
+            self.retained_bytes += size
+            self._memory_bytes += size
+            if self.memory_budget > 0 and self._memory_bytes > self.memory_budget:
+                self._spill()
+
+    def _spill(self) -> None:
+        if self._segment is None:
+            fd, self.segment_path = tempfile.mkstemp(
+                prefix="bsync_flows_", suffix=".jsonl", dir=self.spill_dir
+            )
+            self._segment = os.fdopen(fd, "w+b")
+        self._segment.seek(0, os.SEEK_END)
+        for flow_id, item in self._items.items():
+            if isinstance(item, tuple):
+                self._items[flow_id] = self._segment.tell()
+                self._segment.write(json.dumps(item).encode() + b"\n")
+                self.spilled_count += 1
+        self._segment.flush()
+        self._memory_bytes = 0
+
+    def freeze(self) -> None:
+        """
+        Reduce the flows still in progress. Called on the event loop before the
+        store is handed to the export thread, which must not read live flows
+        that the loop keeps updating.
+        """
+        for flow_id, item in self._items.items():
+            if isinstance(item, http.HTTPFlow):
+                self._items[flow_id] = self._reduce(item)
+
+    def records(self) -> Iterator[FlowRecord]:
+        """
+        Yield every flow as a FlowRecord in recording order, reducing in-progress
+        flows on the fly. Streamed records are not included.
+        """
+        for item in list(self._items.values()):
+            if item is None:
+                continue
+            if isinstance(item, int):
+                self._segment.seek(item)
+                server_id, entry = json.loads(self._segment.readline())
+                yield server_id, entry
+            elif isinstance(item, tuple):
+                yield item
+            else:
+                yield self._reduce(item)
+
+    def close(self) -> None:
+        """Drop all records and delete the spill segment"""
+        self._items = {}
+        self._memory_bytes = 0
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+            os.remove(self.segment_path)
+
+
+class HarSpool:
+    """
+    Append-only .hars spool (see hars.py) of one iteration in streaming mode.
+    Entries are written as their flows complete; finish() adds the footer
+    once the iteration is exported.
+    """
+
+    def __init__(self, spool_dir: str) -> None:
+        os.makedirs(spool_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="bsync_spool_", suffix=".hars", dir=spool_dir)
+        self._writer = hars.HarsWriter(os.fdopen(fd, "wb"))
+        # Connection reuse is resolved per entry like in _iter_entries
+        self._servers_seen: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._writer)
+
+    def add(self, record: FlowRecord) -> None:
+        server_id, entry = record
+        _mark_connection_reuse(server_id, entry, self._servers_seen)
+        self._writer.add(entry)
+
+    def finish(self, records: Iterable[FlowRecord], log: dict) -> None:
+        """Append the remaining records and the footer"""
+        for record in records:
+            self.add(record)
+        self._writer.close(log)
+
+    def discard(self) -> None:
+        self._writer.abort()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _mark_connection_reuse(server_id: str | None, entry: dict, servers_seen: set[str]) -> None:
+    # Entries on a server connection seen before don't pay for connect and TLS setup
+    timings = entry["timings"]
+    if server_id in servers_seen:
+        if timings["connect"] != -1.0 or timings["ssl"] != -1.0:
+            timings["connect"] = -1.0
+            timings["ssl"] = -1.0
+            entry["time"] = sum(v for v in timings.values() if v is not None and v >= 0)
+    elif timings["connect"] >= 0:
+        servers_seen.add(server_id)
+
+
+class HarExportJob(NamedTuple):
+    """Snapshot of one iteration handed to the export thread"""
+    store: FlowStore
+    save_path: str
+    pages: list[dict]
+    tenant: str = ""
+    spool: "HarSpool | None" = None
+    generation: int = 0
+    # Flow budget report for the HAR log, None if the iteration stayed within budget
+    budget: dict | None = None
+    # Entries of earlier iterations' late flows, written to <save_path>.late.jsonl
+    late_entries: list[dict] | None = None
+
+
+# Ways of telling the clients of a shared proxy apart, see the har_tenant_by option
+TENANT_MODES = ("none", "port", "proxyauth")
+
+# flow.metadata key of the iteration generation a flow was first recorded in
+GENERATION_KEY = "bsync_generation"
+# Exported generations whose late flows can still be attributed to their HAR
+LATE_FLOW_GENERATIONS = 4
+# What happens to flows completing after their iteration was exported, see har_late_flows
+LATE_FLOW_MODES = ("drop", "sidecar")
+
+# Distinct (method, host, path template) keys kept per iteration once over the flow budget
+FLOW_SUMMARY_MAX_KEYS = 1000
+# Path segments that look like ids and are collapsed in path templates
+_ID_SEGMENT = re.compile(r"\d+|[0-9a-fA-F]{16,}|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27}")
+
+
+def path_template(path: str) -> str:
+    """Path without query and with id-like segments replaced, e.g. /api/item/123?x=1 -> /api/item/{id}"""
+    path = path.split("?", 1)[0]
+    return "/".join("{id}" if _ID_SEGMENT.fullmatch(segment) else segment for segment in path.split("/"))
+
+
+class CaptureSession:
+    """
+    Capture state of one proxy client (tenant): its recorded flows, HAR path
+    and page metadata. A proxy serving a single worker has only the default
+    session with the empty tenant name.
+    """
+
+    def __init__(self, tenant: str, flow_store: FlowStore, spool: HarSpool | None = None) -> None:
+        self.tenant = tenant
+        self.flow_store = flow_store
+        # Spool the completed entries of flow_store go to in streaming mode
+        self.spool = spool
+        # Iteration generation; every export or clear starts a new one. Flows are
+        # tagged with the generation they were first seen in, so hooks firing for a
+        # flow after its iteration was handed off don't leak it into the next one.
+        self.generation = 0
+        # Generation -> HAR path of recently exported iterations, for late flows
+        self.exported_generations: dict[int, str] = {}
+        # Late flows of exported iterations seen during the current iteration
+        self.late_flows = 0
+        # With har_late_flows=sidecar their entries, tagged with the HAR they belong
+        # to; written next to the HAR of the current iteration when it is exported
+        self.late_entries: list[dict] = []
+        # Set to "flows" or "bytes" once the iteration went over its flow budget;
+        # further flows are then only counted in flow_summary
+        self.budget_exceeded: str | None = None
+        self.flow_summary: dict[tuple[str, str, str], int] = {}
+        # Flows of the current iteration waiting for a response, for network idle
+        # detection; the timer fires network_idle once they stayed at zero long enough
+        self.in_flight: set[str] = set()
+        self.idle_timer: asyncio.TimerHandle | None = None
+        self.idle_reported = False
+        # Per-flow memo of the ignore decision; _save_flow runs from up to
+        # seven hooks per flow, so the classification is done only once.
+        self.flow_ignored: dict[str, bool] = {}
 
-class SaveHarCustom:
-    def __init__(self) -> None:
-        self.flows: list[flow.Flow] = []
-        # Keep a single canonical entry per mitmproxy flow using its id.
-        # This lets us record request-only flows early and later enrich them
-        # when a response or error occurs, without creating duplicates.
-        self.flows_by_id: dict[str, flow.Flow] = {}
-        self.filt: flowfilter.TFilter | None = None
-        
         # Counter for requests in current iteration
         self.request_count = 0
         self.iteration_active = False
+        self.first_response_seen = False
 
         # Internal state for managing the HAR save path, independent of mitmproxy's options.
         self.save_path = ""
 
+        # Page metadata for HAR pages
+        self.current_page_url: str | None = None
+        self.current_page_visit_ts: str | None = None  # ISO string
+        self.current_page_index: str | None = None
+
+    def next_generation(self, exported_path: str | None = None) -> None:
+        """Start a new iteration; exported_path is where the finished one was exported to"""
+        if exported_path:
+            self.exported_generations[self.generation] = exported_path
+            if len(self.exported_generations) > LATE_FLOW_GENERATIONS:
+                del self.exported_generations[min(self.exported_generations)]
+        self.generation += 1
+        self.late_flows = 0
+        self.budget_exceeded = None
+        self.flow_summary = {}
+        self.in_flight = set()
+        self.cancel_idle_timer()
+        self.idle_reported = False
+
+    def cancel_idle_timer(self) -> None:
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+            self.idle_timer = None
+
+    def summarize(self, flow: http.HTTPFlow) -> None:
+        """Count a flow by method, host and path template instead of recording it"""
+        key = (flow.request.method, flow.request.host, path_template(flow.request.path))
+        if key not in self.flow_summary and len(self.flow_summary) >= FLOW_SUMMARY_MAX_KEYS:
+            key = ("", "", "")
+        self.flow_summary[key] = self.flow_summary.get(key, 0) + 1
+
+    def budget_report(self) -> dict | None:
+        if self.budget_exceeded is None:
+            return None
+        summary = sorted(self.flow_summary.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "exceeded": self.budget_exceeded,
+            "summarizedFlows": sum(self.flow_summary.values()),
+            "summary": [
+                {"method": method, "host": host, "path": path, "count": count}
+                if host else {"other": True, "count": count}
+                for (method, host, path), count in summary
+            ],
+        }
+
+    def current_pages(self) -> list[dict]:
+        # Build pages array if page metadata is available
+        pages: list[dict] = []
+        if self.current_page_url and self.current_page_visit_ts:
+            pages.append({
+                "startedDateTime": self.current_page_visit_ts,
+                "id": self.current_page_url,
+                "title": self.current_page_url,
+                "pageTimings": {}
+            })
+        return pages
+
+
+class TimingChannel:
+    """
+    Low-latency side channel for synchronization timestamps. Each event is a
+    single UDP datagram to a loopback address, sent without blocking and
+    without going through the line-buffered IPC on stdout:
+        u8 event, u32 generation, i64 time.monotonic_ns() and f64 time.time()
+        taken together when sending, f64 wall-clock time of the event itself
+        (e.g. flow.request.timestamp_start), followed by the tenant as UTF-8.
+    All little-endian; see handleProxyTimingDatagram in spawnScripts.js.
+    """
+
+    FIRST_REQUEST = 1
+    FIRST_RESPONSE_BYTE = 2
+    EXPORT_QUEUED = 3
+    EXPORT_COMPLETED = 4
+
+    _HEADER = struct.Struct("<BIqdd")
+
+    def __init__(self, address: str) -> None:
+        host, _, port = address.rpartition(":")
+        try:
+            self._address = (host or "127.0.0.1", int(port))
+        except ValueError as e:
+            raise exceptions.OptionsError(f"Invalid har_timing_addr {address!r}, expected host:port") from e
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def send(self, event: int, generation: int, event_time: float, tenant: str = "") -> None:
+        datagram = self._HEADER.pack(
+            event, generation & 0xFFFFFFFF, time.monotonic_ns(), time.time(), event_time
+        ) + tenant.encode()
+        try:
+            self._sock.sendto(datagram, self._address)
+        except OSError:
+            # Nobody listening or the socket buffer is full; timing events are best effort
+            pass
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of latencies in microseconds.
+    Each power of two is split into 2**SUB_BITS / 2 linear buckets, which
+    keeps the relative error of reported percentiles below ~6% while
+    recording is a couple of integer operations and one dict update.
+    """
+
+    SUB_BITS = 5
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._buckets: dict[int, int] = {}
+
+    def record(self, value: int) -> None:
+        shift = max(value.bit_length() - self.SUB_BITS, 0)
+        index = (shift << self.SUB_BITS) + (value >> shift)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def _bucket_value(self, index: int) -> int:
+        shift = index >> self.SUB_BITS
+        mantissa = index & ((1 << self.SUB_BITS) - 1)
+        if shift == 0:
+            return mantissa
+        # Middle of the bucket's value range
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def percentiles(self, quantiles: Sequence[float]) -> list[int]:
+        result = []
+        if not self.count:
+            return [0 for _ in quantiles]
+        ordered = sorted(self._buckets.items())
+        for q in quantiles:
+            target = q * self.count
+            seen = 0
+            for index, n in ordered:
+                seen += n
+                if seen >= target:
+                    result.append(min(self._bucket_value(index), self.max))
+                    break
+        return result
+
+
+class HookProfiler:
+    """Per-hook call counts and latency histograms for the addon"""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.hooks: dict[str, LatencyHistogram] = {}
+        self.flows_completed = 0
+        self._last_snapshot = (self.started, 0)
+        # Hooks are recorded from the event loop and the HAR export thread
+        self._lock = threading.Lock()
+
+    def record(self, hook: str, elapsed_ns: int) -> None:
+        with self._lock:
+            histogram = self.hooks.get(hook)
+            if histogram is None:
+                histogram = self.hooks[hook] = LatencyHistogram()
+            histogram.record(elapsed_ns // 1000)
+
+    def snapshot(self) -> dict:
+        """Cumulative statistics per hook plus the flow rate since the previous snapshot"""
+        now = time.monotonic()
+        with self._lock:
+            last_time, last_flows = self._last_snapshot
+            self._last_snapshot = (now, self.flows_completed)
+            hooks = {}
+            for hook, histogram in sorted(self.hooks.items()):
+                p50, p95, p99 = histogram.percentiles((0.5, 0.95, 0.99))
+                hooks[hook] = {
+                    "count": histogram.count,
+                    "total_ms": round(histogram.total / 1000, 3),
+                    "mean_us": round(histogram.total / histogram.count, 1),
+                    "p50_us": p50,
+                    "p95_us": p95,
+                    "p99_us": p99,
+                    "max_us": histogram.max,
+                }
+        elapsed = now - last_time
+        return {
+            "uptime_s": round(now - self.started, 1),
+            "flows_completed": self.flows_completed,
+            "flows_per_second": round((self.flows_completed - last_flows) / elapsed, 2) if elapsed > 0 else 0,
+            "hooks": hooks,
+        }
+
+
+def profiled(hook: str) -> Callable:
+    """Record the latency of an addon method in its HookProfiler, if profiling is enabled"""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if profiler is None:
+                return fn(self, *args, **kwargs)
+            started = time.perf_counter_ns()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                profiler.record(hook, time.perf_counter_ns() - started)
+        return wrapper
+    return decorate
+
+
+class SaveHarCustom:
+    def __init__(self) -> None:
+        # Codec for plain .har exports and level for every codec (-1: codec default)
+        self.compression = "none"
+        self.compression_level = -1
+        self.zstd_dict: zstandard.ZstdCompressionDict | None = None
+        # Memory budget (bytes) for reduced flows before they spill to disk; 0 keeps them in memory
+        self.flow_store_budget = 0
+        self.flow_store_dir = ""
+        # Capture state per proxy client. Each session keeps a single canonical
+        # entry per mitmproxy flow using its id, which lets us record request-only
+        # flows early and later enrich them when a response or error occurs,
+        # without creating duplicates.
+        self.tenant_by = "none"
+        # Directory of the .hars spools in streaming mode, empty when not streaming
+        self.stream_dir = ""
+        self.late_flow_mode = "drop"
+        # Per-iteration flow budget, 0 for no limit
+        self.flow_limit = 0
+        self.flow_bytes_limit = 0
+        # Quiet window (ms) without flows in flight after which network_idle is sent, 0 to disable
+        self.network_idle_ms = 0
+        self.default_session = CaptureSession("", *self._new_capture())
+        self.sessions: dict[str, CaptureSession] = {"": self.default_session}
+        self.filt: flowfilter.TFilter | None = None
+        # Hosts whose flows are never recorded, rebuilt in configure()
+        self.ignored_hosts = HostMatcher(DEFAULT_IGNORED_HOSTS + (CONTROL_HOST_SUFFIX,))
+
         # If false, omit bodies (request/response) and websocket payloads from HAR
         self.include_payload: bool = False
+        # If true, decode compressed response bodies without payload to report their
+        # decoded size. Otherwise content.compression is omitted for encoded bodies.
+        self.decode_body_sizes: bool = False
         # If true, include CONNECT tunnel handshakes as HAR entries (not browser-visible HTTP).
         # Default False to match website/browser-level logging and OpenWPM http_instrument.
         self.include_connect_flows: bool = True
-        # Page metadata for HAR pages
-        self.current_page_url: str | None = None
-        self.current_page_visit_ts: str | None = None  # ISO string
-        self.current_page_index: str | None = None
+
+        # HAR exports run on a background thread so the event loop keeps
+        # forwarding the next iteration's traffic while the file is written.
+        self._export_queue: queue.Queue[HarExportJob | None] = queue.Queue()
+        self._export_thread: threading.Thread | None = None
+
+        # Control hosts dispatched by request(); also reachable through the control socket
+        self._control_handlers: dict[str, Callable[[CaptureSession, Mapping[str, str]], None]] = {
+            "shutdown.proxy.local": self._control_shutdown,
+            "harddump.proxy.local": self._control_harddump,
+            "hardumppath.proxy.local": self._control_hardumppath,
+            "setpage.proxy.local": self._control_setpage,
+            "clearflows.proxy.local": self._control_clearflows,
+            "getharflows.proxy.local": self._control_getharflows,
+        }
+        self._control_server: asyncio.AbstractServer | None = None
+        self._control_socket_path = ""
+
+        # Timing side channel, None unless har_timing_addr is set
+        self.timing: TimingChannel | None = None
+
+        # Hook latency instrumentation, None when disabled via proxy_metrics
+        self.profiler: HookProfiler | None = HookProfiler()
+        self._metrics_task: asyncio.Task | None = None
 
     @command.command("save.har")
     def export_har(self) -> None:
+        """Export the flows of every client with a HAR path to its HAR file."""
+        for session in list(self.sessions.values()):
+            if session.save_path:
+                self.export_session(session)
+
+    @profiled("export_har")
+    def export_session(self, session: CaptureSession) -> None:
         """
-        Export flows to an HAR file.
+        Export the flows of one client to its HAR file.
         This copies the current flows and clears the internal list *immediately*
         to prevent data from one iteration leaking into the next.
-        The export then proceeds on the copy.
+        The copy is then queued for the background export thread.
         """
-        # We operate on a copy of the canonical flow map.
-        flows_to_export = list(self.flows_by_id.values())
-        flows_before_clear = len(flows_to_export)
-
-        # IMPORTANT: Clear the instance's flow list immediately.
+        # The export takes over the current store, recording continues in a fresh one.
+        store_to_export = session.flow_store
+        store_to_export.freeze()
+        spool_to_export = session.spool
+        generation = session.generation
+        budget = session.budget_report()
+        flows_before_clear = len(store_to_export)
+
+        # IMPORTANT: Hand the session a fresh flow store immediately.
         # This is the critical step to ensure isolation between crawl iterations.
-        self.flows = []
-        self.flows_by_id = {}
-        self.request_count = 0
+        late_flows = session.late_flows
+        late_entries, session.late_entries = session.late_entries, []
+        session.next_generation(session.save_path)
+        self._renew_capture(session)
+        session.flow_ignored = {}
+        session.request_count = 0
+        session.first_response_seen = False
         # The iteration is not active until the next request comes in.
         # It's set to active in the _save_flow method.
-        self.iteration_active = True 
-        
+        session.iteration_active = True 
+
+        # Page metadata may be replaced by the next setpage request before the
+        # export thread gets to this job, so it is captured together with the flows.
+        job = HarExportJob(
+            store_to_export, session.save_path, session.current_pages(), session.tenant, spool_to_export, generation,
+            budget, late_entries,
+        )
+        if self.timing is not None:
+            self.timing.send(TimingChannel.EXPORT_QUEUED, generation, time.time(), session.tenant)
+        self._ensure_export_thread()
+        # Unbounded, so a slow disk delays exports but never drops one or blocks the traffic
+        self._export_queue.put(job)
+        queue_depth = self._export_queue.qsize()
+
+        send_ipc_message("har_export_queued", {
+            "tenant": job.tenant,
+            "flows_count": flows_before_clear,
+            "late_flows": late_flows,
+            "save_path": job.save_path,
+            "queue_depth": queue_depth,
+        })
+        if queue_depth > HAR_EXPORT_BACKLOG_WARN:
+            send_ipc_message("har_export_backlog", {
+                "tenant": job.tenant,
+                "save_path": job.save_path,
+                "queue_depth": queue_depth,
+            })
+
+    def _session_for(self, flow: http.HTTPFlow) -> CaptureSession:
+        """Find the capture session of the client that sent flow"""
+        if self.tenant_by == "none":
+            return self.default_session
+        if self.tenant_by == "port":
+            tenant = str(flow.client_conn.sockname[1])
+        else:
+            # Set by mitmproxy's proxyauth addon, also for requests inside CONNECT tunnels
+            tenant = flow.metadata.get("proxyauth", ("",))[0]
+        return self._session_named(tenant)
+
+    def _session_named(self, tenant: str) -> CaptureSession:
+        session = self.sessions.get(tenant)
+        if session is None:
+            session = self.sessions[tenant] = CaptureSession(tenant, *self._new_capture())
+            self._report_spool(session)
+        return session
+
+    def _renew_capture(self, session: CaptureSession) -> None:
+        """Give a session a fresh flow store (and spool) for its next iteration"""
+        session.flow_store, session.spool = self._new_capture()
+        self._report_spool(session)
+
+    def _renew_empty_captures(self) -> None:
+        """Give sessions that recorded nothing yet a capture with the current settings"""
+        for session in self.sessions.values():
+            if not session.flow_store:
+                if session.spool is not None:
+                    session.spool.discard()
+                self._renew_capture(session)
+
+    def _report_spool(self, session: CaptureSession) -> None:
+        # Spool names are random; this tells consumers which one to tail for the iteration
+        if session.spool is not None:
+            send_ipc_message("har_spool_started", {
+                "tenant": session.tenant,
+                "generation": session.generation,
+                "spool_path": session.spool.path,
+            })
+
+    def _new_capture(self) -> tuple[FlowStore, HarSpool | None]:
+        """Create the flow store, and in streaming mode the spool it streams to, for a new iteration"""
+        size = self._entry_size if self.flow_bytes_limit > 0 or self.flow_store_budget > 0 else None
+        if not self.stream_dir:
+            return FlowStore(self._reduce_flow, self.flow_store_budget, self.flow_store_dir, size=size), None
+        spool = HarSpool(self.stream_dir)
+        return FlowStore(self._reduce_flow, stream=spool.add, size=size), spool
+
+    def _entry_size(self, flow: http.HTTPFlow) -> int:
+        return estimate_entry_size(flow, self.include_payload)
+
+    def _reduce_flow(self, flow: http.HTTPFlow) -> FlowRecord:
+        # Connection reuse is resolved at export time in _iter_entries
+        return flow.server_conn.id, self.flow_entry(flow, set())
+
+    def _ensure_export_thread(self) -> None:
+        if self._export_thread is None or not self._export_thread.is_alive():
+            self._export_thread = threading.Thread(
+                target=self._export_worker, name="har-export", daemon=True
+            )
+            self._export_thread.start()
+
+    def _export_worker(self) -> None:
+        while True:
+            job = self._export_queue.get()
+            try:
+                if job is None:
+                    return
+                self._run_export(job)
+            finally:
+                self._export_queue.task_done()
+
+    @profiled("export_write")
+    def _run_export(self, job: HarExportJob) -> None:
+        flows_before_clear = len(job.store)
+
         send_ipc_message("har_export_started", {
+            "tenant": job.tenant,
             "flows_count": flows_before_clear,
-            "save_path": self.save_path,
+            "save_path": job.save_path,
             "include_payload": self.include_payload,
             "message": "Flows copied and live list cleared for export."
         })
@@ -108,166 +980,352 @@ class SaveHarCustom:
         if PROXY_DEBUG:
             sample = [
                 {
-                    "id": f.id,
-                    "method": f.request.method if f.request else None,
-                    "url": f.request.pretty_url if f.request else None,
-                    "has_response": bool(getattr(f, "response", None)),
-                    "has_error": bool(getattr(f, "error", None)),
+                    "method": entry["request"]["method"],
+                    "url": entry["request"]["url"],
+                    "status": entry["response"]["status"],
+                    "has_error": bool(entry["response"].get("_error")),
                 }
-                for f in flows_to_export[:5]
+                for _, entry in itertools.islice(job.store.records(), 5)
             ]
-            send_ipc_message("har_export_sample", {"sample": sample, "sample_size": len(sample)})
+            send_ipc_message("har_export_sample", {
+                "sample": sample,
+                "sample_size": len(sample),
+                "spilled_count": job.store.spilled_count,
+            })
 
+        # Stream into a temporary file and rename it once complete so the
+        # Node side never picks up a half-written HAR while polling for it.
+        tmp_path = job.save_path + ".part"
         try:
-            har = json.dumps(self.make_har(flows_to_export), indent=4).encode()
+            if job.spool is not None:
+                # Streaming mode: completed entries are already spooled, only the
+                # in-flight flows and the footer are written now.
+                job.spool.finish(
+                    job.store.records(),
+                    self._har_document([], job.pages, job.budget)["log"],
+                )
+                shutil.move(job.spool.path, tmp_path)
+                self._write_late_entries(job)
+                self._send_stream_export_completed(job, tmp_path, flows_before_clear)
+                return
+
+            codec = codec_for_path(job.save_path)
+            zstd_dict = self.zstd_dict if codec == "zstd" else None
+            compressor = make_compressor(codec, self.compression_level, zstd_dict)
+            with HarFileSink(tmp_path, compressor) as sink:
+                if job.save_path.endswith(".harl"):
+                    self.write_harl(job.store.records(), sink, job.pages, job.budget)
+                else:
+                    self.write_har(job.store.records(), sink, job.pages, job.budget)
 
             if PROXY_DEBUG: 
                 send_ipc_message("debug", {"message": "IN_HAR_EXPORT_PROCESS"})
 
-            if self.save_path.endswith(".zhar"):
-                har = zlib.compress(har, 9)
-
-            with open(self.save_path, "wb") as f:
-                f.write(har)
+            # The sidecar is in place before the HAR appears, Node ships both once it sees the HAR
+            late_path = self._write_late_entries(job)
+            os.replace(tmp_path, job.save_path)
 
+            if self.timing is not None:
+                self.timing.send(TimingChannel.EXPORT_COMPLETED, job.generation, time.time(), job.tenant)
             send_ipc_message("har_export_completed", {
-                "file_path": self.save_path,
-                "file_size": len(har),
+                "tenant": job.tenant,
+                "file_path": job.save_path,
+                "late_path": late_path,
+                "file_size": sink.bytes_written,
+                "uncompressed_size": sink.bytes_in,
+                "codec": codec,
+                "compression_level": self.compression_level if self.compression_level >= 0 else CODECS[codec][1],
+                "zstd_dict_id": zstd_dict.dict_id() if zstd_dict is not None else None,
+                "compression_time_ms": round(sink.compression_time * 1000, 3),
                 "flows_exported": flows_before_clear,
-                "flows_remaining_in_proxy": len(self.flows_by_id) # Should always be 0
+                "flows_remaining_in_proxy": len(self._session_named(job.tenant).flow_store) # Flows of the next iteration
             })
         except Exception as e:
             # The flow list is already cleared, but we should log the export error.
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if job.spool is not None:
+                job.spool.discard()
             send_ipc_message("error", {
                 "operation": "har_export",
+                "tenant": job.tenant,
                 "error_message": str(e),
                 "error_type": type(e).__name__,
                 "failed_flows_count": flows_before_clear
             })
+        finally:
+            job.store.close()
+            if self.profiler is not None:
+                send_ipc_message("proxy_metrics", {"trigger": "export", **self.profiler.snapshot()})
+
+    def _write_late_entries(self, job: HarExportJob) -> str | None:
+        """Write the job's late flow entries to <save_path>.late.jsonl, returns its path if any"""
+        if not job.late_entries:
+            return None
+        late_path = job.save_path + ".late.jsonl"
+        with open(late_path + ".part", "w") as f:
+            for entry in job.late_entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(late_path + ".part", late_path)
+        return late_path
+
+    def _send_stream_export_completed(self, job: HarExportJob, tmp_path: str, flows_exported: int) -> None:
+        os.replace(tmp_path, job.save_path)
+        file_size = os.path.getsize(job.save_path)
+        if self.timing is not None:
+            self.timing.send(TimingChannel.EXPORT_COMPLETED, job.generation, time.time(), job.tenant)
+        send_ipc_message("har_export_completed", {
+            "tenant": job.tenant,
+            "file_path": job.save_path,
+            "file_size": file_size,
+            "uncompressed_size": file_size,
+            "codec": "none",
+            "compression_level": 0,
+            "zstd_dict_id": None,
+            "compression_time_ms": 0,
+            "streamed": True,
+            "late_path": job.save_path + ".late.jsonl" if job.late_entries else None,
+            "flows_exported": flows_exported,
+            "flows_remaining_in_proxy": len(self._session_named(job.tenant).flow_store)
+        })
 
+    def wait_for_exports(self) -> None:
+        """Block until every queued HAR export has been written."""
+        if self._export_thread is not None and self._export_thread.is_alive():
+            self._export_queue.join()
+
+    @profiled("request")
     def request(self, flow: http.HTTPFlow) -> None:
+        handler = self._control_handlers.get(flow.request.host)
+        if handler is not None:
+            handler(self._session_for(flow), flow.request.headers)
+            return
 
-        """Handle shutdown request via HTTP"""
-        if flow.request.pretty_url == "http://shutdown.proxy.local/":
-            send_ipc_message("proxy_shutdown_requested", {
-                "message": "Graceful shutdown requested via HTTP",
-                "flows_count": len(self.flows_by_id)
-            })
-            
-            # Perform cleanup before shutdown
-            if self.flows_by_id:
-                send_ipc_message("debug", {
-                    "message": f"Clearing {len(self.flows_by_id)} flows before shutdown"
-                })
-                self.flows = []
-                self.flows_by_id = {}
-            
-            # Shutdown the proxy
-            ctx.master.shutdown()
-            send_ipc_message("proxy_shutdown_requested", {
-                "message": "Graceful shutdown tried via HTTP",
-                "flows_count": len(self.flows_by_id)
+        # Record the flow as early as possible so that request-only flows
+        # (e.g., timeouts/aborts without a response) are included in the HAR.
+        self._save_flow(flow)
+
+    def _control_shutdown(self, session: CaptureSession, headers: Mapping[str, str]) -> None:
+        """Handle shutdown request; this stops the proxy for all clients"""
+        flows_count = sum(len(s.flow_store) for s in self.sessions.values())
+        send_ipc_message("proxy_shutdown_requested", {
+            "message": "Graceful shutdown requested via HTTP",
+            "flows_count": flows_count
+        })
+
+        # Perform cleanup before shutdown
+        if flows_count:
+            send_ipc_message("debug", {
+                "message": f"Clearing {flows_count} flows before shutdown"
             })
-            return
+            for s in self.sessions.values():
+                s.flow_store.close()
+                s.flow_ignored = {}
+                if s.spool is not None:
+                    s.spool.discard()
+                    s.spool = None
+
+        # Shutdown the proxy
+        ctx.master.shutdown()
+        send_ipc_message("proxy_shutdown_requested", {
+            "message": "Graceful shutdown tried via HTTP",
+            "flows_count": sum(len(s.flow_store) for s in self.sessions.values())
+        })
 
-        """Handle hardump request via HTTP"""
-        if flow.request.pretty_url == "http://harddump.proxy.local/":
-            send_ipc_message("hardump_requested", {"flows_count": len(self.flows_by_id)})
-            if self.save_path:
-                try:
-                    self.export_har()
-                except Exception as e:
-                    send_ipc_message("error", {
-                        "operation": "har_export_trigger",
-                        "error_message": str(e),
-                        "error_type": type(e).__name__
-                    })
-            else:
-                 send_ipc_message("error", {
+    def _control_harddump(self, session: CaptureSession, headers: Mapping[str, str]) -> None:
+        """Handle hardump request"""
+        send_ipc_message("hardump_requested", {"tenant": session.tenant, "flows_count": len(session.flow_store)})
+        if session.save_path:
+            try:
+                self.export_session(session)
+            except Exception as e:
+                send_ipc_message("error", {
                     "operation": "har_export_trigger",
-                    "error_message": "Cannot dump HAR, save_path is not set."
+                    "tenant": session.tenant,
+                    "error_message": str(e),
+                    "error_type": type(e).__name__
                 })
+        else:
+             send_ipc_message("error", {
+                "operation": "har_export_trigger",
+                "tenant": session.tenant,
+                "error_message": "Cannot dump HAR, save_path is not set."
+            })
 
+    def _control_hardumppath(self, session: CaptureSession, headers: Mapping[str, str]) -> None:
         """Handle HAR path setting request"""
-        if flow.request.pretty_url == "http://hardumppath.proxy.local/":
-            # Get the HAR path from the request header
-            har_path = flow.request.headers.get('X-Har-Path', '')
-            if har_path:
-                self.save_path = har_path
-                send_ipc_message("har_path_set", {"har_path": har_path})
-        
-        # Handle page metadata for HAR pages
-        if flow.request.pretty_url == "http://setpage.proxy.local/":
-            page_url = flow.request.headers.get('X-Page-Url', '')
-            visit_ts = flow.request.headers.get('X-Visit-Timestamp', '')
-            url_index = flow.request.headers.get('X-Url-Index', '')
-            if page_url and visit_ts:
-                self.current_page_url = page_url
-                self.current_page_visit_ts = visit_ts
-                self.current_page_index = url_index or None
-                send_ipc_message("page_metadata_set", {
-                    "page_url": self.current_page_url,
-                    "visit_timestamp": self.current_page_visit_ts,
-                    "url_index": self.current_page_index,
-                })
-            return
+        har_path = headers.get('X-Har-Path', '')
+        if har_path:
+            if self.stream_dir:
+                # Streamed captures are always written as .hars
+                har_path = os.path.splitext(har_path)[0] + ".hars"
+            elif har_path.endswith(".har"):
+                # Plain .har paths carry the suffix of the selected codec
+                har_path += CODECS[self.compression][0]
+            session.save_path = har_path
+            # In streaming mode the page's entries go to the session's current
+            # spool until the export moves it to har_path; consumers can tail it
+            send_ipc_message("har_path_set", {
+                "tenant": session.tenant,
+                "har_path": har_path,
+                "spool_path": session.spool.path if session.spool is not None else None,
+                "generation": session.generation,
+            })
 
-        # Clear HAR flows
-        if flow.request.pretty_url == "http://clearflows.proxy.local/":
-            flows_before_clear = len(self.flows_by_id)
-            self.flows = []
-            self.flows_by_id = {}
-            send_ipc_message("flows_cleared", {
-                "flows_before_clear": flows_before_clear,
-                "flows_after_clear": len(self.flows_by_id)
+    def _control_setpage(self, session: CaptureSession, headers: Mapping[str, str]) -> None:
+        """Handle page metadata for HAR pages"""
+        page_url = headers.get('X-Page-Url', '')
+        visit_ts = headers.get('X-Visit-Timestamp', '')
+        url_index = headers.get('X-Url-Index', '')
+        if page_url and visit_ts:
+            session.current_page_url = page_url
+            session.current_page_visit_ts = visit_ts
+            session.current_page_index = url_index or None
+            send_ipc_message("page_metadata_set", {
+                "tenant": session.tenant,
+                "page_url": session.current_page_url,
+                "visit_timestamp": session.current_page_visit_ts,
+                "url_index": session.current_page_index,
             })
 
-        if flow.request.pretty_url == "http://getharflows.proxy.local/":
-            send_ipc_message("har_flows_info", {"flows_count": len(self.flows_by_id)})
+    def _control_clearflows(self, session: CaptureSession, headers: Mapping[str, str]) -> None:
+        """Clear HAR flows"""
+        flows_before_clear = len(session.flow_store)
+        session.flow_store.close()
+        if session.spool is not None:
+            session.spool.discard()
+        session.next_generation()
+        self._renew_capture(session)
+        session.flow_ignored = {}
+        send_ipc_message("flows_cleared", {
+            "tenant": session.tenant,
+            "flows_before_clear": flows_before_clear,
+            "flows_after_clear": len(session.flow_store)
+        })
 
-        # Record the flow as early as possible so that request-only flows
-        # (e.g., timeouts/aborts without a response) are included in the HAR.
-        # _save_flow will no-op for control URLs under .proxy.local.
-        self._save_flow(flow)
+    def _control_getharflows(self, session: CaptureSession, headers: Mapping[str, str]) -> None:
+        send_ipc_message("har_flows_info", {"tenant": session.tenant, "flows_count": len(session.flow_store)})
+
+    async def _handle_control_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one client of the control socket. Each line is a JSON object
+        {"command": "<name>", "headers": {...}, "tenant": "<client>"} where name
+        is the control host without .proxy.local, headers are the ones the HTTP
+        variant would send and the optional tenant selects the capture session.
+        Every command is answered with a JSON line {"ok": bool[, "error": str]}.
+        """
+        try:
+            while line := await reader.readline():
+                try:
+                    message = json.loads(line)
+                    handler = self._control_handlers[f"{message['command']}{CONTROL_HOST_SUFFIX[1:]}"]
+                    handler(self._session_named(str(message.get("tenant", ""))), message.get("headers") or {})
+                    reply = {"ok": True}
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {"ok": False, "error": f"Invalid control command: {e}"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _start_control_socket(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)
+        self._control_server = await asyncio.start_unix_server(self._handle_control_client, path)
+        send_ipc_message("control_socket_ready", {"path": path})
+
+    def _stop_control_socket(self) -> None:
+        if self._control_server is not None:
+            self._control_server.close()
+            self._control_server = None
+            if self._control_socket_path and os.path.exists(self._control_socket_path):
+                os.unlink(self._control_socket_path)
 
     def make_har(self, flows: Sequence[flow.Flow]) -> dict:
-        entries = []
+        entries = list(self._iter_entries(self._flow_records(flows)))
+        return self._har_document(entries, self.default_session.current_pages())
+
+    def write_har(
+        self,
+        records: Iterable[FlowRecord],
+        sink: "HarFileSink",
+        pages: list[dict] | None = None,
+        budget: dict | None = None,
+    ) -> None:
+        """
+        Serialize flow records as HAR into sink one entry at a time.
+        Produces the same document as make_har, but only a single entry is
+        held in memory at any point instead of the whole entries list.
+        """
+        # Render the log skeleton with an empty entries list and split it at
+        # the list brackets; "entries" is the last key so the last "[]" is it.
+        if pages is None:
+            pages = self.default_session.current_pages()
+        skeleton = json.dumps(self._har_document([], pages, budget), indent=4)
+        split_at = skeleton.rindex("[]")
+        sink.write(skeleton[:split_at + 1].encode())
+
+        separator = "\n"
+        for entry in self._iter_entries(records):
+            sink.write((separator + _indent_json(entry, HAR_ENTRY_INDENT)).encode())
+            separator = ",\n"
+        if separator != "\n":
+            sink.write(("\n" + " " * (HAR_ENTRY_INDENT - 4)).encode())
+
+        sink.write(skeleton[split_at + 1:].encode())
+
+    def write_harl(
+        self,
+        records: Iterable[FlowRecord],
+        sink: "HarFileSink",
+        pages: list[dict] | None = None,
+        budget: dict | None = None,
+    ) -> None:
+        """Serialize flow records into sink in the columnar .harl format (see harl.py)"""
+        if pages is None:
+            pages = self.default_session.current_pages()
+        encoder = harl.HarlEncoder(sink.write, self._har_document([], pages, budget)["log"])
+        for entry in self._iter_entries(records):
+            encoder.add(entry)
+        encoder.close()
+
+    def _flow_records(self, flows: Sequence[flow.Flow]) -> Iterator[FlowRecord]:
         skipped = 0
-        # A list of server seen till now is maintained so we can avoid
-        # using 'connect' time for entries that use an existing connection.
-        servers_seen: set[Server] = set()
-
         for f in flows:
             if isinstance(f, http.HTTPFlow):
-                entries.append(self.flow_entry(f, servers_seen))
+                yield self._reduce_flow(f)
             else:
                 skipped += 1
 
         if skipped > 0:
             logger.info(f"Skipped {skipped} flows that weren't HTTP flows.")
 
-        # Build pages array if page metadata is available
-        pages: list[dict] = []
-        if self.current_page_url and self.current_page_visit_ts:
-            pages.append({
-                "startedDateTime": self.current_page_visit_ts,
-                "id": self.current_page_url,
-                "title": self.current_page_url,
-                "pageTimings": {}
-            })
-
-        return {
-            "log": {
-                "version": "1.2",
-                "creator": {
-                    "name": "mitmproxy",
-                    "version": version.VERSION,
-                    "comment": f"bsync mitmproxy HAR export; payload={'on' if self.include_payload else 'off'}",
-                },
-                "pages": pages,
-                "entries": entries,
-            }
+    def _iter_entries(self, records: Iterable[FlowRecord]) -> Iterator[dict]:
+        # A list of server seen till now is maintained so we can avoid
+        # using 'connect' time for entries that use an existing connection.
+        servers_seen: set[str] = set()
+
+        for server_id, entry in records:
+            _mark_connection_reuse(server_id, entry, servers_seen)
+            yield entry
+
+    def _har_document(self, entries: list[dict], pages: list[dict], budget: dict | None = None) -> dict:
+        log = {
+            "version": "1.2",
+            "creator": {
+                "name": "mitmproxy",
+                "version": version.VERSION,
+                "comment": f"bsync mitmproxy HAR export; payload={'on' if self.include_payload else 'off'}",
+            },
+            "pages": pages,
         }
+        if budget is not None:
+            log["_flowBudget"] = budget
+        # write_har relies on entries being the last key
+        log["entries"] = entries
+        return {"log": log}
 
     def load(self, loader: Loader):
         loader.add_option(
@@ -280,12 +1338,213 @@ class SaveHarCustom:
             For mitmdump, enabling this option will mean that flows are kept in memory.
             """,
         )
+        loader.add_option(
+            "har_ignore_hosts",
+            Sequence[str],
+            [],
+            """
+            Additional hosts whose flows are left out of the HAR.
+            Use "*.example.com" to match a domain and all of its subdomains.
+            """,
+        )
+        loader.add_option(
+            "har_ignore_hosts_file",
+            str,
+            "",
+            """
+            File with additional hosts to leave out of the HAR, one rule per line
+            in the same format as har_ignore_hosts.
+            """,
+        )
+        loader.add_option(
+            "har_flow_limit",
+            int,
+            0,
+            """
+            Soft limit of recorded flows per iteration, 0 for none. Further flows are
+            only counted per method, host and path template in the HAR log's
+            _flowBudget, and a flow_budget_exceeded IPC message is sent.
+            """,
+        )
+        loader.add_option(
+            "har_flow_bytes_limit",
+            int,
+            0,
+            """
+            Soft limit of HAR entry bytes per iteration, 0 for none. Entry sizes
+            are estimated from URL, header and body lengths. Handled like
+            har_flow_limit.
+            """,
+        )
+        loader.add_option(
+            "har_network_idle_ms",
+            int,
+            0,
+            """
+            Send a network_idle IPC message once no flow of the current iteration
+            has been waiting for its response for this many milliseconds, and
+            network_busy when a flow starts after that. Flows summarized over the
+            flow budget count as waiting too. 0 disables idle detection.
+            """,
+        )
+        loader.add_option(
+            "har_timing_addr",
+            str,
+            "",
+            """
+            host:port of a local UDP socket to send first request, first response
+            byte and export timestamps to as binary datagrams. Disabled if empty.
+            """,
+        )
+        loader.add_option(
+            "har_late_flows",
+            str,
+            "drop",
+            """
+            Flows completing after their iteration was exported are never added
+            to the next HAR. "drop" only counts them, "sidecar" also writes their
+            entries to <HAR path>.late.jsonl next to the HAR exported after them,
+            each with the HAR path of the iteration it started in as "_harPath".
+            """,
+            choices=LATE_FLOW_MODES,
+        )
+        loader.add_option(
+            "har_stream_dir",
+            str,
+            "",
+            """
+            Stream completed HAR entries to an append-only .hars spool in this
+            directory as they happen; an export then only appends the footer and
+            moves the spool to the HAR path (as .hars, see hars.py). Disabled if empty.
+            """,
+        )
+        loader.add_option(
+            "har_tenant_by",
+            str,
+            "none",
+            """
+            Keep separate flows, HAR path and page metadata per proxy client so
+            several workers can share one proxy. "port" tells clients apart by the
+            listen port they connect to (use one --mode regular@PORT per worker),
+            "proxyauth" by proxy username (needs the proxyauth option, e.g. "any").
+            Control commands select their session by the same key: HTTP control
+            requests by port or proxy credentials, control socket commands by
+            their "tenant" field.
+            """,
+            choices=TENANT_MODES,
+        )
+        loader.add_option(
+            "har_control_socket",
+            str,
+            "",
+            """
+            Path of a Unix socket accepting the *.proxy.local control commands
+            as JSON lines, bypassing the proxy pipeline. Disabled if empty.
+            """,
+        )
+        loader.add_option(
+            "proxy_metrics",
+            bool,
+            True,
+            """
+            Collect per-hook call counts and latency histograms and send them
+            as proxy_metrics IPC messages after every HAR export.
+            """,
+        )
+        loader.add_option(
+            "proxy_metrics_interval",
+            int,
+            60,
+            """
+            Also send proxy_metrics every this many seconds, 0 to only send them on export.
+            """,
+        )
+        loader.add_option(
+            "har_compression",
+            str,
+            "none",
+            """
+            Compression codec for .har exports, the codec's suffix is appended
+            to the file name (.har.gz, .har.zz, .har.zst, .har.lz4).
+            .zhar files always use zlib and .harl files zstd.
+            """,
+            choices=list(CODECS),
+        )
+        loader.add_option(
+            "har_compression_level",
+            int,
+            -1,
+            """
+            Compression level for the HAR export codec, -1 for the codec's default.
+            """,
+        )
+        loader.add_option(
+            "har_zstd_dict",
+            str,
+            "",
+            """
+            Trained zstd dictionary (zstd --train) used for zstd compressed exports.
+            Readers need the same dictionary to decompress them.
+            """,
+        )
+        loader.add_option(
+            "har_decode_body_sizes",
+            bool,
+            False,
+            """
+            Decode compressed response bodies to report their decoded size in
+            content.compression even when payloads are not included in the HAR.
+            """,
+        )
+        loader.add_option(
+            "har_flow_store_budget",
+            int,
+            0,
+            """
+            Memory budget in bytes for completed flows of the current iteration.
+            Above it, completed flows are spilled to a temporary file until the
+            HAR is exported. 0 keeps all flows in memory.
+            """,
+        )
+        loader.add_option(
+            "har_flow_store_dir",
+            str,
+            "",
+            """
+            Directory for spilled flows. Defaults to the system temp directory.
+            """,
+        )
         send_ipc_message("proxy_loaded")
 
     def running(self):
         """Called when the proxy is fully started"""
+        self._ensure_export_thread()
+        loop = asyncio.get_running_loop()
+        self._metrics_task = loop.create_task(self._emit_metrics_periodically())
+        if self._control_socket_path:
+            loop.create_task(self._start_control_socket(self._control_socket_path))
         send_ipc_message("proxy_ready")
 
+    async def _emit_metrics_periodically(self) -> None:
+        while True:
+            interval = ctx.options.proxy_metrics_interval
+            await asyncio.sleep(interval if interval > 0 else 60)
+            if self.profiler is not None and interval > 0:
+                send_ipc_message("proxy_metrics", {"trigger": "interval", **self.profiler.snapshot()})
+
+    def done(self):
+        """Called on shutdown; finish pending HAR exports before the process exits"""
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+        self._stop_control_socket()
+        if self._export_thread is not None and self._export_thread.is_alive():
+            self.wait_for_exports()
+            self._export_queue.put(None)
+            self._export_thread.join()
+        for session in self.sessions.values():
+            if session.spool is not None:
+                session.spool.discard()
+
     def configure(self, updated):
         if "save_stream_filter" in updated:
             if ctx.options.save_stream_filter:
@@ -296,6 +1555,92 @@ class SaveHarCustom:
             else:
                 self.filt = None
 
+        if "har_ignore_hosts" in updated or "har_ignore_hosts_file" in updated:
+            rules = list(DEFAULT_IGNORED_HOSTS) + [CONTROL_HOST_SUFFIX]
+            rules.extend(ctx.options.har_ignore_hosts)
+            if ctx.options.har_ignore_hosts_file:
+                try:
+                    rules.extend(HostMatcher.read_rules(ctx.options.har_ignore_hosts_file))
+                except OSError as e:
+                    raise exceptions.OptionsError(
+                        f"Cannot read har_ignore_hosts_file: {e}"
+                    ) from e
+            self.ignored_hosts = HostMatcher(rules)
+            for session in self.sessions.values():
+                session.flow_ignored = {}
+            send_ipc_message("debug", {
+                "message": f"Host filter compiled with {self.ignored_hosts.rule_count} rules."
+            })
+
+        if "har_flow_limit" in updated or "har_flow_bytes_limit" in updated:
+            # The byte limit needs measured stores, so it applies from the next iteration
+            # of each client on, or right away if nothing was recorded yet
+            self.flow_limit = max(ctx.options.har_flow_limit, 0)
+            self.flow_bytes_limit = max(ctx.options.har_flow_bytes_limit, 0)
+            self._renew_empty_captures()
+
+        if "har_network_idle_ms" in updated:
+            self.network_idle_ms = max(ctx.options.har_network_idle_ms, 0)
+
+        if "har_timing_addr" in updated:
+            if self.timing is not None:
+                self.timing.close()
+                self.timing = None
+            if ctx.options.har_timing_addr:
+                self.timing = TimingChannel(ctx.options.har_timing_addr)
+
+        if "har_late_flows" in updated:
+            self.late_flow_mode = ctx.options.har_late_flows
+
+        if "har_stream_dir" in updated:
+            # Applies from the next iteration of each client on, or right away if nothing was recorded yet
+            self.stream_dir = ctx.options.har_stream_dir
+            self._renew_empty_captures()
+
+        if "har_tenant_by" in updated:
+            self.tenant_by = ctx.options.har_tenant_by
+
+        if "har_control_socket" in updated:
+            self._control_socket_path = ctx.options.har_control_socket
+
+        if "proxy_metrics" in updated:
+            if not ctx.options.proxy_metrics:
+                self.profiler = None
+            elif self.profiler is None:
+                self.profiler = HookProfiler()
+
+        if "har_compression" in updated or "har_compression_level" in updated:
+            if ctx.options.har_compression == "lz4":
+                try:
+                    import lz4.frame  # noqa: F401
+                except ImportError as e:
+                    raise exceptions.OptionsError(
+                        "har_compression=lz4 requires the lz4 package"
+                    ) from e
+            self.compression = ctx.options.har_compression
+            self.compression_level = ctx.options.har_compression_level
+
+        if "har_zstd_dict" in updated:
+            if ctx.options.har_zstd_dict:
+                try:
+                    with open(ctx.options.har_zstd_dict, "rb") as f:
+                        self.zstd_dict = zstandard.ZstdCompressionDict(f.read())
+                except OSError as e:
+                    raise exceptions.OptionsError(
+                        f"Cannot read har_zstd_dict: {e}"
+                    ) from e
+            else:
+                self.zstd_dict = None
+
+        if "har_decode_body_sizes" in updated:
+            self.decode_body_sizes = ctx.options.har_decode_body_sizes
+
+        if "har_flow_store_budget" in updated or "har_flow_store_dir" in updated:
+            # Applies from the next iteration of each client on, or right away if nothing was recorded yet
+            self.flow_store_budget = ctx.options.har_flow_store_budget
+            self.flow_store_dir = ctx.options.har_flow_store_dir
+            self._renew_empty_captures()
+
         if "hardump" in updated:
             # We no longer react to hardump option changes for automatic saving.
             # This is now fully controlled via HTTP requests.
@@ -304,72 +1649,112 @@ class SaveHarCustom:
                     "message": "hardump option cleared, but no action taken (manual control)."
                 })
 
+    @profiled("response")
     def response(self, flow: http.HTTPFlow) -> None:
+        self._flow_done(flow)
+
+    @profiled("error")
+    def error(self, flow: http.HTTPFlow) -> None:
+        self._flow_done(flow)
+
+    def _flow_done(self, flow: http.HTTPFlow) -> None:
+        """Completion of a flow, shared by response and error so each is profiled only once"""
+        # An open websocket is not page load activity, its flow is done for idle detection
+        self._flow_finished(flow)
         # websocket flows will receive a websocket_end,
         # we don't want to persist them here already
         if flow.websocket is None:
-            self._save_flow(flow)
-
-    def error(self, flow: http.HTTPFlow) -> None:
-        self.response(flow)
+            self._save_flow(flow, final=True)
 
+    @profiled("websocket_end")
     def websocket_end(self, flow: http.HTTPFlow) -> None:
-        self._save_flow(flow)
+        self._save_flow(flow, final=True)
 
     # Capture flows as early as possible so aborted/timeout requests are included.
+    @profiled("requestheaders")
     def requestheaders(self, flow: http.HTTPFlow) -> None:
         self._save_flow(flow)
+        self._flow_started(flow)
 
+    @profiled("responseheaders")
     def responseheaders(self, flow: http.HTTPFlow) -> None:
         self._save_flow(flow)
+        if self.timing is not None:
+            session = self._session_for(flow)
+            if (
+                session.iteration_active
+                and not session.first_response_seen
+                and flow.metadata.get(GENERATION_KEY) == session.generation
+            ):
+                session.first_response_seen = True
+                self.timing.send(
+                    TimingChannel.FIRST_RESPONSE_BYTE, session.generation, flow.response.timestamp_start, session.tenant
+                )
 
     # Include CONNECT requests (TLS tunnel setup). If TLS fails later, we still
     # retain a record for the attempted connection.
+    @profiled("http_connect")
     def http_connect(self, flow: http.HTTPFlow) -> None:
         if self.include_connect_flows:
             self._save_flow(flow)
 
     # Also record on disconnect events, which may occur without a proper error.
+    @profiled("clientdisconnect")
     def clientdisconnect(self, layer) -> None:  # layer carries .flow for HTTP layers
         f = getattr(layer, "flow", None)
         if isinstance(f, http.HTTPFlow):
             self._save_flow(f)
 
+    @profiled("serverdisconnect")
     def serverdisconnect(self, layer) -> None:
         f = getattr(layer, "flow", None)
         if isinstance(f, http.HTTPFlow):
             self._save_flow(f)
 
-    def _save_flow(self, flow: http.HTTPFlow) -> None:
-        # Skip requests to *.proxy.local domains which are used for HTTP control
-        if ".proxy.local" in flow.request.pretty_url:
-            return
-        # Skip CONNECT by default (proxy handshake is not a browser-level HTTP request)
-        if flow.request.method == "CONNECT" and not self.include_connect_flows:
+    def _is_ignored(self, session: CaptureSession, flow: http.HTTPFlow) -> bool:
+        ignored = session.flow_ignored.get(flow.id)
+        if ignored is None:
+            # Skip requests to *.proxy.local domains which are used for HTTP control
+            # and Firefox/Mozilla background requests.
+            # Skip CONNECT by default (proxy handshake is not a browser-level HTTP request)
+            ignored = (
+                flow.request.host in self.ignored_hosts
+                or (flow.request.method == "CONNECT" and not self.include_connect_flows)
+            )
+            session.flow_ignored[flow.id] = ignored
+        return ignored
+
+    @profiled("_save_flow")
+    def _save_flow(self, flow: http.HTTPFlow, final: bool = False) -> None:
+        """
+        Record a flow. final=True is passed once the flow is complete
+        (response, error or websocket_end), which reduces it to its HAR record.
+        """
+        session = self._session_for(flow)
+        if self._is_ignored(session, flow):
             return
             
-        # Filter out Firefox/Mozilla background requests.
-        ignored_hosts = [
-            "detectportal.firefox.com",
-            "firefox.settings.services.mozilla.com",
-            "push.services.mozilla.com",
-            "location.services.mozilla.com",
-            "shavar.services.mozilla.com",
-            "snippets.cdn.mozilla.net",
-            "normandy.cdn.mozilla.net",
-            "aus5.mozilla.org",
-            "content-signature-2.cdn.mozilla.net",
-            "mozilla.cloudflare-dns.com",
-        ]
-        if flow.request.host in ignored_hosts or "cdn.mozilla.net" in flow.request.host:
+        generation = flow.metadata.setdefault(GENERATION_KEY, session.generation)
+        if generation != session.generation:
+            if final:
+                self._late_flow(session, flow, generation)
             return
-            
+
         flow_matches = self.filt is None or self.filt(flow)
         if flow_matches:
             # Canonicalize by flow.id to avoid duplicates across request/response/error hooks
-            existed = flow.id in self.flows_by_id
-            previous = self.flows_by_id.get(flow.id)
-            self.flows_by_id[flow.id] = flow
+            existed = flow.id in session.flow_store
+            if not existed and self._over_flow_budget(session):
+                session.summarize(flow)
+                # Later hooks of this flow skip it like an ignored one, but a runaway
+                # page is still busy while its summarized flows are in flight
+                session.flow_ignored[flow.id] = True
+                if self.network_idle_ms:
+                    self._mark_in_flight(session, flow)
+                return
+            session.flow_store.add(flow, final=final)
+            if final and self.profiler is not None:
+                self.profiler.flows_completed += 1
 
             if PROXY_DEBUG:
                 if not existed:
@@ -379,33 +1764,132 @@ class SaveHarCustom:
                         "url": flow.request.pretty_url,
                         "has_response": bool(flow.response),
                         "has_error": bool(flow.error),
-                        "stored_count": len(self.flows_by_id),
+                        "stored_count": len(session.flow_store),
+                    })
+                elif final:
+                    # Report when a response or error completed a known flow
+                    send_ipc_message("flow_updated", {
+                        "id": flow.id,
+                        "method": flow.request.method,
+                        "url": flow.request.pretty_url,
+                        "has_response": bool(flow.response),
+                        "has_error": bool(flow.error),
+                        "stored_count": len(session.flow_store),
                     })
-                else:
-                    # Report if a response or error appeared later
-                    prev_has_resp = bool(previous and previous.response)
-                    prev_has_err = bool(previous and previous.error)
-                    if (not prev_has_resp and bool(flow.response)) or (not prev_has_err and bool(flow.error)):
-                        send_ipc_message("flow_updated", {
-                            "id": flow.id,
-                            "method": flow.request.method,
-                            "url": flow.request.pretty_url,
-                            "has_response": bool(flow.response),
-                            "has_error": bool(flow.error),
-                            "stored_count": len(self.flows_by_id),
-                        })
             
             # Check if this is the first request of the iteration
-            if self.iteration_active and self.request_count == 0:
-                self.request_count += 1
+            if session.iteration_active and session.request_count == 0:
+                session.request_count += 1
+                if self.timing is not None:
+                    self.timing.send(
+                        TimingChannel.FIRST_REQUEST, session.generation, flow.request.timestamp_start, session.tenant
+                    )
                 send_ipc_message("first_request_detected", {
+                    "tenant": session.tenant,
                     "method": flow.request.method,
                     "url": flow.request.pretty_url,
                     "host": flow.request.headers.get("Host", "unknown"),
                     "timestamp": flow.request.timestamp_start
                 })
-            elif self.iteration_active:
-                self.request_count += 1
+            elif session.iteration_active:
+                session.request_count += 1
+
+    def _flow_started(self, flow: http.HTTPFlow) -> None:
+        if not self.network_idle_ms:
+            return
+        session = self._session_for(flow)
+        if self._is_ignored(session, flow) or flow.metadata.get(GENERATION_KEY) != session.generation:
+            return
+        self._mark_in_flight(session, flow)
+
+    def _mark_in_flight(self, session: CaptureSession, flow: http.HTTPFlow) -> None:
+        session.in_flight.add(flow.id)
+        session.cancel_idle_timer()
+        if session.idle_reported:
+            # Re-arm: the next quiet period is reported again, and the worker drops
+            # the end of the visit it scheduled for the previous one
+            session.idle_reported = False
+            send_ipc_message("network_busy", {
+                "tenant": session.tenant,
+                "generation": session.generation,
+                "url": flow.request.pretty_url,
+            })
+
+    def _flow_finished(self, flow: http.HTTPFlow) -> None:
+        if not self.network_idle_ms:
+            return
+        session = self._session_for(flow)
+        if flow.id not in session.in_flight:
+            return
+        session.in_flight.discard(flow.id)
+        if not session.in_flight and not session.idle_reported:
+            session.idle_timer = asyncio.get_running_loop().call_later(
+                self.network_idle_ms / 1000, self._network_idle, session, session.generation, time.time()
+            )
+
+    def _network_idle(self, session: CaptureSession, generation: int, idle_since: float) -> None:
+        """Report that the session's iteration had no flows in flight for network_idle_ms"""
+        session.idle_timer = None
+        if session.generation != generation or session.in_flight or session.idle_reported:
+            return
+        session.idle_reported = True
+        send_ipc_message("network_idle", {
+            "tenant": session.tenant,
+            "generation": generation,
+            "idle_since": idle_since,
+            "quiet_ms": self.network_idle_ms,
+            "flows_count": len(session.flow_store),
+            "page_url": session.current_page_url,
+        })
+
+    def _over_flow_budget(self, session: CaptureSession) -> bool:
+        """Whether the session's iteration is over the flow budget; reported once per iteration"""
+        if session.budget_exceeded is None:
+            store = session.flow_store
+            if self.flow_limit and len(store) >= self.flow_limit:
+                session.budget_exceeded = "flows"
+            elif self.flow_bytes_limit and store.retained_bytes >= self.flow_bytes_limit:
+                session.budget_exceeded = "bytes"
+            else:
+                return False
+            send_ipc_message("flow_budget_exceeded", {
+                "tenant": session.tenant,
+                "reason": session.budget_exceeded,
+                "flows_count": len(store),
+                "retained_bytes": store.retained_bytes,
+                "flow_limit": self.flow_limit,
+                "flow_bytes_limit": self.flow_bytes_limit,
+                "page_url": session.current_page_url,
+            })
+        return True
+
+    def _late_flow(self, session: CaptureSession, flow: http.HTTPFlow, generation: int) -> None:
+        """
+        Handle a flow completing after the iteration it started in was exported
+        or cleared. It is never recorded into the current iteration; with
+        har_late_flows=sidecar its entry, tagged with the HAR path of the
+        iteration it belongs to, is kept for the sidecar of the current one.
+        """
+        exported_path = session.exported_generations.get(generation)
+        if exported_path is None:
+            # Started in a cleared iteration, nothing to attribute it to
+            return
+        if self.filt is not None and not self.filt(flow):
+            return
+        session.late_flows += 1
+        if self.late_flow_mode == "sidecar":
+            server_id, entry = self._reduce_flow(flow)
+            entry["_harPath"] = exported_path
+            session.late_entries.append(entry)
+        if PROXY_DEBUG:
+            send_ipc_message("late_flow", {
+                "tenant": session.tenant,
+                "id": flow.id,
+                "url": flow.request.pretty_url,
+                "generation": generation,
+                "current_generation": session.generation,
+                "har_path": exported_path,
+            })
 
     # def done(self):
     #     if ctx.options.hardump:
@@ -415,6 +1899,7 @@ class SaveHarCustom:
     #         else:
     #             self.export_har(self.flows, ctx.options.hardump)
 
+    @profiled("flow_entry")
     def flow_entry(self, flow: http.HTTPFlow, servers_seen: set[Server]) -> dict:
         """Creates HAR entry from flow"""
 
@@ -465,29 +1950,38 @@ class SaveHarCustom:
             "wait": wait,
         }
 
+        # Decoding gzip/brotli bodies is the dominant cost of building entries,
+        # so it only happens when payloads are kept or decoded sizes are asked for.
+        decode_bodies = self.include_payload or self.decode_body_sizes
+
         if flow.response:
-            try:
-                content = flow.response.content
-            except ValueError:
-                content = flow.response.raw_content
-            response_body_size = (
-                len(flow.response.raw_content) if flow.response.raw_content else 0
-            )
-            response_body_decoded_size = len(content) if content else 0
-            response_body_compression = response_body_decoded_size - response_body_size
+            raw_content = flow.response.raw_content
+            response_body_size = len(raw_content) if raw_content else 0
+            if decode_bodies:
+                try:
+                    content = flow.response.content
+                except ValueError:
+                    content = raw_content
+                response_body_decoded_size = len(content) if content else 0
+            elif flow.response.headers.get("Content-Encoding", "identity").lower() == "identity":
+                # Not encoded, the decoded size is the transferred size (i.e. Content-Length)
+                response_body_decoded_size = response_body_size
+            else:
+                # Encoded body that we don't decode, leave the compression unknown
+                response_body_decoded_size = None
+            response_content: dict[str, Any] = {"size": response_body_size}
+            if response_body_decoded_size is not None:
+                response_content["compression"] = response_body_decoded_size - response_body_size
+            response_content["mimeType"] = flow.response.headers.get("Content-Type", "")
             response = {
                 "status": flow.response.status_code,
                 "statusText": flow.response.reason,
                 "httpVersion": flow.response.http_version,
                 "cookies": self.format_response_cookies(flow.response),
                 "headers": self.format_multidict(flow.response.headers),
-                "content": {
-                    "size": response_body_size,
-                    "compression": response_body_compression,
-                    "mimeType": flow.response.headers.get("Content-Type", ""),
-                },
+                "content": response_content,
                 "redirectURL": flow.response.headers.get("Location", ""),
-                "headersSize": len(str(flow.response.headers)),
+                "headersSize": self.headers_size(flow.response.headers),
                 "bodySize": response_body_size,
             }
             if self.include_payload:
@@ -542,8 +2036,8 @@ class SaveHarCustom:
                 "cookies": self.format_multidict(flow.request.cookies),
                 "headers": self.format_multidict(flow.request.headers),
                 "queryString": self.format_multidict(flow.request.query),
-                "headersSize": len(str(flow.request.headers)),
-                "bodySize": len(flow.request.content) if flow.request.content else 0,
+                "headersSize": self.headers_size(flow.request.headers),
+                "bodySize": self._request_body_size(flow.request, decode_bodies),
             },
             "response": response,
             "cache": {},
@@ -603,6 +2097,15 @@ class SaveHarCustom:
             rv.append(cookie)
         return rv
 
+    def headers_size(self, headers: http.Headers) -> int:
+        """Size of the header block as sent, computed from the raw header fields"""
+        # Every field is serialized as b"name: value\r\n"
+        return sum(len(name) + len(value) + 4 for name, value in headers.fields)
+
+    def _request_body_size(self, request: http.Request, decode_bodies: bool) -> int:
+        body = request.content if decode_bodies else request.raw_content
+        return len(body) if body else 0
+
     def format_multidict(self, obj: _MultiDict[str, str]) -> list[dict]:
         return [{"name": k, "value": v} for k, v in obj.items(multi=True)]
     
@@ -0,0 +1,61 @@
+"""
+Tests of the mitmproxy addon in proxyController.py. They need the proxy
+environment (mitmproxy, zstandard); run them with python -m pytest Client/proxy/tests
+"""
+
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("mitmproxy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import proxyController  # noqa: E402
+from mitmproxy.test import taddons  # noqa: E402
+from mitmproxy.test import tflow  # noqa: E402
+
+
+@pytest.fixture
+def addon():
+    a = proxyController.SaveHarCustom()
+    with taddons.context(a) as tctx:
+        a.tctx = tctx
+        yield a
+        a.wait_for_exports()
+
+
+def control(addon, host, port=None, **headers):
+    """Send a control request (e.g. "harddump") to addon, from listen port port if given"""
+    f = tflow.tflow()
+    f.request.host = host + ".proxy.local"
+    f.request.port = 80
+    f.request.path = "/"
+    if port is not None:
+        f.client_conn.sockname = ("127.0.0.1", port)
+    for name, value in headers.items():
+        f.request.headers[name.replace("_", "-")] = value
+    addon.request(f)
+    return f
+
+
+def capture(addon, port=None, path="/", host="example.com", final=True):
+    """Run a completed flow through addon, from listen port port if given"""
+    f = tflow.tflow(resp=True)
+    f.request.host = host
+    f.request.path = path
+    if port is not None:
+        f.client_conn.sockname = ("127.0.0.1", port)
+    addon.requestheaders(f)
+    addon.request(f)
+    if final:
+        addon.response(f)
+    return f
+
+
+def dump(addon, save_path, port=None):
+    """Export the current iteration to save_path and wait until it is written"""
+    control(addon, "hardumppath", port, X_Har_Path=str(save_path))
+    control(addon, "harddump", port)
+    addon.wait_for_exports()
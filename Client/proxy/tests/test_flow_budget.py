@@ -0,0 +1,56 @@
+import json
+
+import proxyController
+from conftest import capture, control, dump
+
+
+def test_path_template():
+    assert proxyController.path_template("/api/item/123/x/0123456789abcdef0123?q=1") == "/api/item/{id}/x/{id}"
+    assert proxyController.path_template("/u/123e4567-e89b-12d3-a456-426614174000") == "/u/{id}"
+
+
+def test_flow_limit_summarizes_overflow(addon, tmp_path):
+    addon.tctx.configure(addon, har_flow_limit=3)
+    for i in range(10):
+        capture(addon, path=f"/beacon/{i}?t=1")
+
+    session = addon.default_session
+    assert len(session.flow_store) == 3
+    assert session.budget_exceeded == "flows"
+
+    dump(addon, tmp_path / "out.har")
+
+    log = json.loads((tmp_path / "out.har").read_text())["log"]
+    assert len(log["entries"]) == 3
+    assert log["_flowBudget"] == {
+        "exceeded": "flows",
+        "summarizedFlows": 7,
+        "summary": [{"method": "GET", "host": "example.com", "path": "/beacon/{id}", "count": 7}],
+    }
+    # The budget applies per iteration
+    assert session.budget_exceeded is None
+    assert session.flow_summary == {}
+
+
+def test_byte_limit_summarizes_overflow(addon):
+    addon.tctx.configure(addon, har_flow_bytes_limit=2000)
+    for i in range(10):
+        capture(addon, path=f"/page/{i}")
+
+    session = addon.default_session
+    store = session.flow_store
+    assert session.budget_exceeded == "bytes"
+    assert 0 < len(store) < 10
+    assert store.retained_bytes >= 2000
+    assert sum(session.flow_summary.values()) == 10 - len(store)
+
+
+def test_har_without_overflow_has_no_budget(addon, tmp_path):
+    addon.tctx.configure(addon, har_flow_limit=3)
+    capture(addon)
+    control(addon, "clearflows")
+    capture(addon)
+
+    dump(addon, tmp_path / "out.har")
+
+    assert "_flowBudget" not in json.loads((tmp_path / "out.har").read_text())["log"]
@@ -0,0 +1,44 @@
+import json
+
+import proxyController
+from conftest import capture, dump
+from mitmproxy.test import tflow
+
+
+def _flows(count):
+    flows = []
+    for i in range(count):
+        f = tflow.tflow(resp=i % 3 != 0, err=i % 3 == 0)
+        f.request.host = f"example{i % 4}.com"
+        f.request.path = f"/resource/{i}"
+        flows.append(f)
+    return flows
+
+
+def test_write_har_matches_make_har(addon, tmp_path):
+    flows = _flows(12)
+    expected = json.dumps(addon.make_har(flows), indent=4)
+
+    path = tmp_path / "out.har"
+    with proxyController.HarFileSink(str(path)) as sink:
+        addon.write_har(addon._flow_records(flows), sink)
+
+    assert path.read_text() == expected
+
+
+def test_write_har_without_entries(addon, tmp_path):
+    path = tmp_path / "empty.har"
+    with proxyController.HarFileSink(str(path)) as sink:
+        addon.write_har([], sink)
+
+    assert path.read_text() == json.dumps(addon.make_har([]), indent=4)
+
+
+def test_export_writes_streamed_har(addon, tmp_path):
+    flows = [capture(addon, path=f"/page/{i}") for i in range(5)]
+    expected = addon.make_har(flows)
+
+    dump(addon, tmp_path / "out.har")
+
+    assert json.loads((tmp_path / "out.har").read_text()) == expected
+    assert not (tmp_path / "out.har.part").exists()
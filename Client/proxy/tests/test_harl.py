@@ -0,0 +1,20 @@
+import harl
+from conftest import dump
+from mitmproxy.test import tflow
+
+
+def test_harl_round_trip(addon, tmp_path):
+    # More entries than fit in one column block
+    flows = []
+    for i in range(600):
+        f = tflow.tflow(resp=i % 3 != 0, err=i % 3 == 0)
+        f.request.host = f"example{i % 4}.com"
+        addon.request(f)
+        addon.response(f) if f.response else addon.error(f)
+        flows.append(f)
+    expected = addon.make_har(flows)
+
+    dump(addon, tmp_path / "out.harl")
+
+    assert harl.harl_to_har(str(tmp_path / "out.harl")) == expected
+    assert len(list(harl.iter_blocks(str(tmp_path / "out.harl")))) == 3
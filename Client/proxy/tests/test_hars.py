@@ -0,0 +1,18 @@
+import hars
+from conftest import capture, dump
+
+
+def test_hars_round_trip(addon, tmp_path):
+    addon.tctx.configure(addon, har_stream_dir=str(tmp_path / "spool"))
+    flows = [capture(addon, path=f"/page/{i}") for i in range(5)]
+    pending = capture(addon, path="/pending", final=False)
+
+    dump(addon, tmp_path / "out.har")
+
+    path = str(tmp_path / "out.hars")
+    har = hars.hars_to_har(path)
+    assert hars.read_footer(path)["count"] == 6
+    urls = [entry["request"]["url"] for entry in har["log"]["entries"]]
+    assert urls == [f.request.url for f in flows] + [pending.request.url]
+    # Completed entries were spooled before the export, the pending one with it
+    assert [e["request"]["url"] for e in hars.iter_entries(path)] == urls
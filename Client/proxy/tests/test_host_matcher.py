@@ -0,0 +1,49 @@
+import proxyController
+from conftest import capture
+
+
+def test_exact_and_suffix_rules():
+    matcher = proxyController.HostMatcher(["aus5.mozilla.org", "*.cdn.mozilla.net", ".example.org", " ", ""])
+
+    assert "aus5.mozilla.org" in matcher
+    assert "AUS5.Mozilla.org" in matcher
+    assert "www.aus5.mozilla.org" not in matcher
+    assert "cdn.mozilla.net" in matcher
+    assert "x.cdn.mozilla.net" in matcher
+    assert "a.b.cdn.mozilla.net" in matcher
+    assert "mozilla.net" not in matcher
+    assert "xcdn.mozilla.net" not in matcher
+    assert "www.example.org" in matcher
+    assert matcher.rule_count == 3
+
+
+def test_default_rules_cover_control_hosts():
+    matcher = proxyController.HostMatcher(
+        proxyController.DEFAULT_IGNORED_HOSTS + (proxyController.CONTROL_HOST_SUFFIX,)
+    )
+
+    assert "harddump.proxy.local" in matcher
+    assert "normandy.cdn.mozilla.net" in matcher
+    assert "example.com" not in matcher
+    assert matcher.rule_count == len(proxyController.DEFAULT_IGNORED_HOSTS) + 1
+
+
+def test_read_rules_skips_comments(tmp_path):
+    rules = tmp_path / "hosts.txt"
+    rules.write_text("# tracking\nfoo.com\n*.bar.org  # and subdomains\n\n")
+
+    assert proxyController.HostMatcher.read_rules(str(rules)) == ["", "foo.com", "*.bar.org", ""]
+
+
+def test_ignored_hosts_are_not_recorded(addon, tmp_path):
+    rules = tmp_path / "hosts.txt"
+    rules.write_text("foo.com\n*.bar.org\n")
+    addon.tctx.configure(addon, har_ignore_hosts=["baz.net"], har_ignore_hosts_file=str(rules))
+
+    for host in ("foo.com", "a.bar.org", "baz.net", "detectportal.firefox.com"):
+        capture(addon, host=host)
+    kept = capture(addon, host="example.com")
+
+    store = addon.default_session.flow_store
+    assert len(store) == 1
+    assert kept.id in store
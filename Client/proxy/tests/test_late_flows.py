@@ -0,0 +1,60 @@
+import json
+
+from conftest import capture, control, dump
+from mitmproxy.test import tflow
+
+
+def _har_urls(path):
+    return [entry["request"]["url"] for entry in json.loads(path.read_text())["log"]["entries"]]
+
+
+def test_late_flow_goes_to_sidecar_of_next_export(addon, tmp_path):
+    addon.tctx.configure(addon, har_late_flows="sidecar")
+    longpoll = capture(addon, path="/longpoll", final=False)
+    done = capture(addon, path="/done")
+    dump(addon, tmp_path / "a.har")
+
+    assert _har_urls(tmp_path / "a.har") == [longpoll.request.url, done.request.url]
+
+    longpoll.response = tflow.tresp()
+    addon.response(longpoll)
+    new = capture(addon, path="/new")
+
+    session = addon.default_session
+    assert longpoll.id not in session.flow_store
+    assert session.late_flows == 1
+    # Sidecars are written by the export thread, never on the event loop
+    assert not (tmp_path / "a.har.late.jsonl").exists()
+
+    dump(addon, tmp_path / "b.har")
+
+    assert _har_urls(tmp_path / "b.har") == [new.request.url]
+    late = [json.loads(line) for line in (tmp_path / "b.har.late.jsonl").read_text().splitlines()]
+    assert [entry["request"]["url"] for entry in late] == [longpoll.request.url]
+    assert late[0]["_harPath"] == str(tmp_path / "a.har")
+
+
+def test_late_flow_is_dropped_without_sidecar(addon, tmp_path):
+    longpoll = capture(addon, path="/longpoll", final=False)
+    dump(addon, tmp_path / "a.har")
+
+    longpoll.response = tflow.tresp()
+    addon.response(longpoll)
+    assert addon.default_session.late_flows == 1
+    dump(addon, tmp_path / "b.har")
+
+    assert _har_urls(tmp_path / "b.har") == []
+    assert not (tmp_path / "b.har.late.jsonl").exists()
+
+
+def test_flow_from_cleared_iteration_is_not_late(addon, tmp_path):
+    addon.tctx.configure(addon, har_late_flows="sidecar")
+    stale = capture(addon, path="/stale", final=False)
+    control(addon, "clearflows")
+
+    stale.response = tflow.tresp()
+    addon.response(stale)
+    dump(addon, tmp_path / "a.har")
+
+    assert addon.default_session.late_flows == 0
+    assert _har_urls(tmp_path / "a.har") == []
@@ -0,0 +1,50 @@
+import json
+
+from conftest import capture, control, dump
+from mitmproxy.test import tflow
+
+
+def _urls(path):
+    return [entry["request"]["url"] for entry in json.loads(path.read_text())["log"]["entries"]]
+
+
+def test_flows_are_split_by_listen_port(addon, tmp_path):
+    addon.tctx.configure(addon, har_tenant_by="port")
+    a = capture(addon, port=8081, path="/a")
+    b = capture(addon, port=8082, path="/b")
+
+    assert {"8081", "8082"} <= set(addon.sessions)
+    assert len(addon.default_session.flow_store) == 0
+    assert a.id in addon.sessions["8081"].flow_store
+    assert b.id not in addon.sessions["8081"].flow_store
+
+    dump(addon, tmp_path / "a.har", port=8081)
+
+    assert _urls(tmp_path / "a.har") == [a.request.url]
+    # The other client's iteration is untouched by the export
+    assert len(addon.sessions["8082"].flow_store) == 1
+    dump(addon, tmp_path / "b.har", port=8082)
+    assert _urls(tmp_path / "b.har") == [b.request.url]
+
+
+def test_page_metadata_is_per_tenant(addon):
+    addon.tctx.configure(addon, har_tenant_by="port")
+    control(addon, "setpage", port=8081, X_Page_Url="https://a.example/", X_Visit_Timestamp="2024-01-01T00:00:00Z")
+
+    assert addon.sessions["8081"].current_page_url == "https://a.example/"
+    assert addon._session_named("8082").current_page_url != "https://a.example/"
+
+
+def test_flows_are_split_by_proxy_user(addon):
+    addon.tctx.configure(addon, har_tenant_by="proxyauth")
+    flows = {}
+    for user in ("worker1", "worker2"):
+        f = tflow.tflow(resp=True)
+        f.metadata["proxyauth"] = (user, "")
+        addon.requestheaders(f)
+        addon.response(f)
+        flows[user] = f
+
+    assert flows["worker1"].id in addon.sessions["worker1"].flow_store
+    assert flows["worker2"].id in addon.sessions["worker2"].flow_store
+    assert flows["worker2"].id not in addon.sessions["worker1"].flow_store
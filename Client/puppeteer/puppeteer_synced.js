@@ -80,6 +80,9 @@ async function launchBrowser() {
     process.stdout.write("browser_ready");
 }
 
+// Resolves the stay of the current visit early
+let endStay = null;
+
 async function visitUrl(url, waitingtime = 0, stayTime = 3, restart = false) {
     // if (useragent) {
     //     await page.setUserAgent(useragent);
@@ -104,8 +107,12 @@ async function visitUrl(url, waitingtime = 0, stayTime = 3, restart = false) {
     } else {
         console.log(`Staying on page for ${stayTime} seconds`);
 
-        // Stay on site for stayTime
-        await new Promise(resolve => setTimeout(resolve, stayTime * 1000));
+        // Stay on site for stayTime, or until the worker sends end_visit
+        await new Promise(resolve => {
+            endStay = resolve;
+            setTimeout(resolve, stayTime * 1000);
+        });
+        endStay = null;
 
         if (screenshotpath) {
             try {
@@ -215,8 +222,9 @@ async function resetBrowser() {
     
             const url = data.url;
             // const useragent = data.userAgent;
-            const waitingtime = data.waitingtime || 0;
-            const stayTime = data.stayTime || 3; 
+            // startAt (epoch ms) is the planned start, waitingTime the same delay as sent
+            const waitingtime = data.startAt ? Math.max(data.startAt - Date.now(), 0) : (data.waitingTime || 0);
+            const stayTime = data.visitDuration || 3; 
             const restart = data.restart || false;
     
             if (url) {
@@ -231,6 +239,9 @@ async function resetBrowser() {
                 console.log("No valid URL provided.");
             }
 
+        } else if (input === "end_visit") {
+            if (endStay) endStay();
+
         } else if (input === "check_readiness") {
             console.log("Browser ready status: ", browser.isConnected());
             process.stdout.write("browser_ready");
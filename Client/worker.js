@@ -51,6 +51,7 @@ socket.on("connect", () => {
 
   // console.log("Client session id: " + socket.sessionid); // debug
   socket.emit("initialization", worker.client_name);
+  if (baseConfig.clock_sync_interval > 0) syncClock();
 
 });
 
@@ -82,6 +83,21 @@ socket.io.on("reconnect_attempt", (attempt)=>{
   console.log(colorize("SOCKETIO:", "cyan") + " Trying to reconnect.");
 });
 
+// NTP-style clock sync: the scheduler replies with its receive (t1) and send (t2) time,
+// the scheduler clock offset for visits with a targetTime is estimated from these samples
+function syncClock() {
+  const t0 = Date.now();
+  socket.emit("clocksync", t0, (reply) => {
+    const t3 = Date.now();
+    if (!reply || reply.t0 !== t0) return;
+    spawnedScripts.addClockSample({ t0: t0, t1: reply.t1, t2: reply.t2, t3: t3 });
+  });
+}
+
+if (baseConfig.clock_sync_interval > 0) {
+  setInterval(() => { if (socket.connected) syncClock(); }, baseConfig.clock_sync_interval);
+}
+
 socket.on("ping", function(){
   console.log(colorize("SOCKETIO:", "cyan") + " Testing latency to master server...");
   socket.emit("pingresults", worker.client_name);
@@ -199,7 +215,7 @@ socket.on("visit_url", async (jobData) => {
 });
 
 function createUrlIterationConfig(jobData) { // urlIndex is 1-based
-  const { clearUrl, urlIndex, totalUrls, visitTimestamp } = jobData;
+  const { clearUrl, urlIndex, totalUrls, visitTimestamp, targetTime } = jobData;
 
   const config = {
       url: '',
@@ -209,7 +225,8 @@ function createUrlIterationConfig(jobData) { // urlIndex is 1-based
       urlIndex: urlIndex, // Already 1-based
       visitDuration: baseConfig.pagevisit_duration,
       totalUrls: totalUrls,
-      visitTimestamp: visitTimestamp || null
+      visitTimestamp: visitTimestamp || null,
+      targetTime: targetTime || null
   };
   //console.log("createUrlIterationConfig: " + JSON.stringify(config)); // debug
 
@@ -280,9 +297,9 @@ process.on('scriptUrlDoneRelay', () => {
   socket.emit("URL_DONE");
 });
 
-process.on('scriptBrowserReadyRelay', (clientName) => {
+process.on('scriptBrowserReadyRelay', (clientName, restartMs) => {
   console.log(colorize("SOCKETIO:", "cyan") + " Relaying browser_ready to scheduler for client: ", clientName);
-  socket.emit("browser_ready", clientName);
+  socket.emit("browser_ready", clientName, restartMs);
 });
 
 process.on('proxyInitialized', () => {
@@ -8,6 +8,8 @@ const config = module.exports = {
     calibration_runs : 5,             // set number of runs measuring the http access time between browsers (default 10)
     re_calibration : 1010,            // repeat calibration afer number of websites crawled (default 100)
     re_calibration_dc: false,         // recalibarte after reconnection of worker
+    sync_start_lead : 0,              // set milliseconds between sending a url and the absolute instant workers start the visit at
+                                       // (clock offset estimated by the workers), 0 to start after the relative waiting time only
 
     timeout_ms : 60000,               // set milliseconds after which the browser is restarted when the urldone signal is not received
                                        // adjust that to the time browsers stay on the website e.g 4x
@@ -57,6 +57,9 @@ module.exports ={
                 if (element.errorArray && element.errorArray.length > 0) {
                     logMessage += ", " + element.errorArray[0];
                 }
+                if (element.flowBudgetArray && element.flowBudgetArray[0]) {
+                    logMessage += ", Flow budget exceeded: " + element.flowBudgetArray[0];
+                }
     
             fs.appendFileSync(file, logMessage);
         });
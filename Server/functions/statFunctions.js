@@ -85,6 +85,7 @@ module.exports ={
             element.maxDelayArray =[];
             element.errorArray =[];
             element.browserFinishedArray =[];
+            element.flowBudgetArray =[];
 
             if(calibrationDone) element.waitingTimeArray =[];
             
@@ -100,6 +101,7 @@ module.exports ={
             element.maxDelayArray =[];
             element.errorArray =[];
             element.browserFinishedArray =[];
+            element.flowBudgetArray =[];
 
             if(calibrationDone) element.waitingTimeArray =[];
             
@@ -180,6 +180,7 @@ io.on("connection", socket => {
             requestArray: [], 
             doneArray: [], 
             browserFinishedArray: [], 
+            flowBudgetArray: [], 
             maxDelayArray: [], 
             avgDelay: 0, 
             waitMs: 0, 
@@ -196,6 +197,7 @@ io.on("connection", socket => {
             requestArray: [], 
             doneArray: [], 
             browserFinishedArray: [], 
+            flowBudgetArray: [], 
             maxDelayArray: [], 
             errorArray: []
         });
@@ -268,6 +270,12 @@ io.on("connection", socket => {
         }
     })
     
+    // Clock sync request from a worker: reply with receive and send time for its offset estimate
+    socket.on("clocksync", (t0, ack) => {
+        const t1 = Date.now();
+        if (typeof ack === "function") ack({ t0: t0, t1: t1, t2: Date.now() });
+    })
+
     // todo maybe implement continuous pingtest before each url
     socket.on("pingresults", (data)=> {
 
@@ -349,7 +357,7 @@ io.on("connection", socket => {
         pendingJobs -= 1;
 
         // Extract data from iterationData
-        const { harPath, urlVisitError, processingError, firstRequestAfterMs } = iterationData || {}; // Default to empty object if undefined
+        const { harPath, urlVisitError, processingError, firstRequestAfterMs, flowBudgetExceeded } = iterationData || {}; // Default to empty object if undefined
         const clientName = socket.data.clientname.toString();
         const currentUrlForLog = currentJobData.clearUrl ? currentJobData.clearUrl.toString() : "N/A";
         const currentUrlIndexForLog = urlsDone + 1; // 1-based index for logging
@@ -367,6 +375,9 @@ io.on("connection", socket => {
         if (processingError) {
             console.log("\x1b[31mERROR: " + ` Client ${clientName} reported a HAR processing error for ${currentUrlForLog}: ${processingError}`);
         }
+        if (flowBudgetExceeded) {
+            console.log("\x1b[33mWARNING: \x1b[0m" + `Client ${clientName} exceeded the proxy flow budget (${flowBudgetExceeded}) for ${currentUrlForLog}, later flows are only summarized in its HAR`);
+        }
 
         let arrayPosition = helperFunctions.searchArray(calibrationDone ? arrayStatistics : arrayClients, clientName, 1);;
 
@@ -388,6 +399,8 @@ io.on("connection", socket => {
             browserFinishedMs = undefined;
         }
         tempArray[arrayPosition].browserFinishedArray.push(browserFinishedMs);
+        // Reason ("flows" or "bytes") if the HAR of this iteration is incomplete
+        tempArray[arrayPosition].flowBudgetArray.push(flowBudgetExceeded || undefined);
 
         if(tempDateUrlDone == undefined || urlVisitError || processingError){ // Adjusted condition
 
@@ -584,7 +597,7 @@ io.on("connection", socket => {
         }
     })
 
-    socket.on("browser_ready", (data)=> {   
+    socket.on("browser_ready", (data, restartMs)=> {   
 
         //console.log("browser_ready triggered"); // debug
         if (activeClients != config.num_clients || ongoingCrawl == false) return;
@@ -619,7 +632,8 @@ io.on("connection", socket => {
             tempArray[arrayPosition].readyArray.push(timeBrowserReady);
 
             browsersReady += 1;
-            console.log("\x1b[33mSTATUS: \x1b[0m" + browsersReady + "/" + config.num_clients + " " + data + "'s browser ready");
+            console.log("\x1b[33mSTATUS: \x1b[0m" + browsersReady + "/" + config.num_clients + " " + data + "'s browser ready"
+                + (typeof restartMs === "number" ? " (browser restart took " + restartMs + " ms)" : ""));
             currentReadyWorkers.add(tempName);
 
         } else {
@@ -776,7 +790,9 @@ io.on("connection", socket => {
         const visitTimestamp = new Date().toISOString();
 
         timeUrlSent = Date.now();
-        io.sockets.emit("visit_url", { ...currentJobData, visitTimestamp });
+        // Absolute start instant on the scheduler clock, workers add their waitingTime to it
+        const targetTime = config.sync_start_lead > 0 ? timeUrlSent + config.sync_start_lead : null;
+        io.sockets.emit("visit_url", { ...currentJobData, visitTimestamp, targetTime });
 
         pendingJobs += config.num_clients;
 